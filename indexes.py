@@ -0,0 +1,376 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# ساختارهای کمکی (ایندکس و تجمیع) که DataManager به‌صورت افزایشی نگه می‌دارد
+
+GRANULARITIES = ('hour', 'day', 'month')
+
+# یکسان‌سازی نویسه‌های عربی/فارسی، ارقام و حذف نیم‌فاصله و اعراب برای جستجو
+_SEARCH_FOLD = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی',
+    'ك': 'ک',
+    'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و',
+    **{chr(0x06F0 + d): str(d) for d in range(10)},  # ارقام فارسی
+    **{chr(0x0660 + d): str(d) for d in range(10)},  # ارقام عربی
+    **{chr(c): None for c in range(0x064B, 0x0653)},  # اعراب
+    '\u0670': None,  # الف خنجری (بالانویس)
+    '\u0640': None,  # کشیده
+    '\u200c': None,  # نیم‌فاصله (ZWNJ)
+    '\u200d': None,  # ZWJ
+    '\u200e': None, '\u200f': None,  # نشانه‌های جهت
+})
+
+def normalize_search_text(text) -> str:
+    """کلید جستجوی یکسان‌شده: ی/ک فارسی، ارقام لاتین، بدون نیم‌فاصله و اعراب، حروف کوچک"""
+    return str(text).translate(_SEARCH_FOLD).casefold()
+
+def _bucket_key(date: datetime, granularity: str) -> int:
+    """شماره بازه زمانی تاریخ (ساعت، روز یا ماه) به صورت عدد صحیح صعودی"""
+    if granularity == 'hour':
+        return date.toordinal() * 24 + date.hour
+    if granularity == 'day':
+        return date.toordinal()
+    if granularity == 'month':
+        return date.year * 12 + date.month - 1
+    raise ValueError(f'بازه زمانی نامعتبر: {granularity}')
+
+def _bucket_date(key: int, granularity: str) -> datetime:
+    """ابتدای بازه متناظر با شماره بازه"""
+    if granularity == 'hour':
+        day, hour = divmod(key, 24)
+        return datetime.fromordinal(day).replace(hour=hour)
+    if granularity == 'day':
+        return datetime.fromordinal(key)
+    year, month = divmod(key, 12)
+    return datetime(year, month + 1, 1)
+
+
+class _BucketSeries:
+    """شماره بازه‌های مرتب و جمع ورود و خروج هر بازه در سه آرایه موازی"""
+    __slots__ = ('keys', 'entered', 'withdrawn')
+
+    def __init__(self):
+        self.keys = array('q')
+        self.entered = array('q')
+        self.withdrawn = array('q')
+
+    def add(self, key: int, column: int, quantity: int):
+        keys = self.keys
+        # تراکنش‌ها معمولاً به ترتیب تاریخ می‌رسند و به آخرین بازه یا بازه جدید انتهایی می‌روند
+        if keys and keys[-1] == key:
+            i = len(keys) - 1
+        else:
+            i = bisect_left(keys, key)
+            if i == len(keys) or keys[i] != key:
+                keys.insert(i, key)
+                self.entered.insert(i, 0)
+                self.withdrawn.insert(i, 0)
+        values = self.withdrawn if column else self.entered
+        values[i] += quantity
+        if self.entered[i] == 0 and self.withdrawn[i] == 0:
+            # حذف بازه خالی شده پس از کسر
+            del keys[i]
+            del self.entered[i]
+            del self.withdrawn[i]
+
+    def get(self, key: int) -> Optional[Tuple[int, int]]:
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return self.entered[i], self.withdrawn[i]
+        return None
+
+    def between(self, first: Optional[int], last: Optional[int]) -> Iterator[Tuple[int, int, int]]:
+        lo = 0 if first is None else bisect_left(self.keys, first)
+        hi = len(self.keys) if last is None else bisect_right(self.keys, last)
+        for i in range(lo, hi):
+            yield self.keys[i], self.entered[i], self.withdrawn[i]
+
+
+class TransactionRollups:
+    """جمع ورود و خروج کل انبار در بازه‌های ساعتی، روزانه و ماهانه و هر کالا در بازه‌های product_granularities"""
+    def __init__(self, product_granularities: Tuple[str, ...] = ('day', 'month')):
+        # بازه‌های ساعتی هر کالا بیشترین حافظه را می‌گیرند و به صورت پیش‌فرض نگه داشته نمی‌شوند
+        self.product_granularities = tuple(product_granularities)
+        self._reset()
+
+    def _reset(self):
+        # بازه -> کد کالا -> سری بازه‌ها
+        self._by_product: Dict[str, Dict[str, _BucketSeries]] = {g: {} for g in self.product_granularities}
+        # بازه -> سری بازه‌ها برای همه کالاها
+        self._totals: Dict[str, _BucketSeries] = {g: _BucketSeries() for g in GRANULARITIES}
+
+    def tracks_products(self, granularity: str) -> bool:
+        return granularity in self._by_product
+
+    def add(self, transaction, sign: int = 1):
+        """افزودن (sign=1) یا کسر (sign=-1) یک تراکنش از همه بازه‌ها"""
+        date = transaction.date
+        if date is None or date != date:  # تاریخ خالی یا NaT
+            return
+        if transaction.transaction_type == 'ورود':
+            column = 0
+        elif transaction.transaction_type == 'خروج':
+            column = 1
+        else:
+            return
+        quantity = sign * transaction.quantity
+        for granularity in GRANULARITIES:
+            key = _bucket_key(date, granularity)
+            self._totals[granularity].add(key, column, quantity)
+            products = self._by_product.get(granularity)
+            if products is not None:
+                series = products.get(transaction.product_code)
+                if series is None:
+                    if sign < 0:
+                        # سری کالای حذف‌شده قبلاً کنار گذاشته شده است
+                        continue
+                    series = products[transaction.product_code] = _BucketSeries()
+                series.add(key, column, quantity)
+                if not series.keys:
+                    del products[transaction.product_code]
+
+    def add_many(self, transactions: Iterable):
+        for t in transactions:
+            self.add(t)
+
+    def product_codes(self) -> set:
+        return {code for products in self._by_product.values() for code in products}
+
+    def pop_product(self, product_code) -> Dict[str, _BucketSeries]:
+        """جدا کردن سری‌های یک کالا (هنگام حذف کالا)؛ برای بازگردانی به restore_product داده می‌شود"""
+        return {granularity: products.pop(product_code)
+                for granularity, products in self._by_product.items() if product_code in products}
+
+    def restore_product(self, product_code, series: Dict[str, _BucketSeries]):
+        for granularity, product_series in series.items():
+            self._by_product[granularity][product_code] = product_series
+
+    def rebuild(self, transactions: Iterable):
+        """ساخت دوباره همه بازه‌ها از کل دفتر"""
+        self._reset()
+        self.add_many(transactions)
+
+    def activity(self, granularity: str = 'day', start: Optional[datetime] = None,
+                 end: Optional[datetime] = None, product_code: Optional[str] = None) -> List[Tuple[datetime, int, int]]:
+        """فهرست مرتب (ابتدای بازه، ورود، خروج) در محدوده تاریخ داده‌شده"""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f'بازه زمانی نامعتبر: {granularity}')
+        if product_code is None:
+            series = self._totals[granularity]
+        elif granularity in self._by_product:
+            series = self._by_product[granularity].get(product_code)
+            if series is None:
+                return []
+        else:
+            raise ValueError(f'تجمیع {granularity} برای هر کالا نگه داشته نمی‌شود')
+        first = _bucket_key(start, granularity) if start is not None else None
+        last = _bucket_key(end, granularity) if end is not None else None
+        return [(_bucket_date(key, granularity), entered, withdrawn)
+                for key, entered, withdrawn in series.between(first, last)]
+
+    def movement_last_days(self, days: int, product_code: Optional[str] = None,
+                           now: Optional[datetime] = None) -> Tuple[int, int]:
+        """جمع (ورود، خروج) در N روز اخیر با مراجعه به N بازه روزانه"""
+        if days <= 0:
+            return 0, 0
+        if product_code is None:
+            series = self._totals['day']
+        else:
+            series = self._by_product['day'].get(product_code)
+            if series is None:
+                return 0, 0
+        today = _bucket_key(now or datetime.now(), 'day')
+        entered = withdrawn = 0
+        for _, day_entered, day_withdrawn in series.between(today - days + 1, today):
+            entered += day_entered
+            withdrawn += day_withdrawn
+        return entered, withdrawn
+
+
+class TrigramIndex:
+    """ایندکس زیررشته‌ای مبتنی بر trigram برای جستجوی سریع کالاها؛ جستجوهای کوتاه‌تر از ۳ نویسه متن‌ها را پیمایش می‌کنند"""
+    N = 3
+
+    def __init__(self):
+        self._texts: Dict[object, str] = {}
+        self._postings: Dict[str, set] = {}
+
+    def _grams(self, text: str):
+        return {text[i:i + self.N] for i in range(len(text) - self.N + 1)}
+
+    def normalize(self, text: str) -> str:
+        return normalize_search_text(text)
+
+    def add(self, key, text: str):
+        text = self.normalize(text)
+        self._texts[key] = text
+        for gram in self._grams(text):
+            self._postings.setdefault(gram, set()).add(key)
+
+    def remove(self, key):
+        text = self._texts.pop(key, None)
+        if text is None:
+            return
+        for gram in self._grams(text):
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+
+    def search(self, query: str) -> set:
+        """کلیدهایی که متن آن‌ها شامل query است"""
+        query = self.normalize(query)
+        if not query:
+            return set(self._texts)
+        if len(query) < self.N:
+            # نگه‌داشتن ۱ و ۲-gramها حافظه زیادی می‌گیرد؛ پیمایش متن‌ها برای پرسش‌های کوتاه کافی است
+            return {key for key, text in self._texts.items() if query in text}
+        if len(query) == self.N:
+            return set(self._postings.get(query, ()))
+        # اشتراک فهرست‌های trigram از کوچک‌ترین، سپس تأیید زیررشته
+        postings = []
+        for i in range(len(query) - self.N + 1):
+            keys = self._postings.get(query[i:i + self.N])
+            if not keys:
+                return set()
+            postings.append(keys)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for keys in postings[1:]:
+            candidates &= keys
+            if not candidates:
+                break
+        return {key for key in candidates if query in self._texts[key]}
+
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+def date_key(date) -> Optional[int]:
+    """کلید عددی (میکروثانیه از ۱۹۷۰) برای مرتب‌سازی تاریخ؛ None برای تاریخ خالی"""
+    if date is None or date != date:  # تاریخ خالی یا NaT
+        return None
+    return (date - _EPOCH) // _MICROSECOND
+
+
+class DateIndex:
+    """شماره ردیف‌های دفتر مرتب بر اساس تاریخ، با پشتیبانی از درج خارج از ترتیب"""
+    # تا این تعداد ردیف با تاریخ گذشته، درج تکی (جابه‌جایی حافظه در C) از ادغام با دنباله ایندکس ارزان‌تر است
+    _INSERT_LIMIT = 256
+
+    def __init__(self):
+        self._keys = array('q')
+        self._rows = array('q')
+
+    def add(self, date, row: int):
+        key = date_key(date)
+        if key is None:
+            return
+        if not self._keys or key >= self._keys[-1]:
+            self._keys.append(key)
+            self._rows.append(row)
+        else:
+            # تراکنش با تاریخ گذشته
+            i = bisect_right(self._keys, key)
+            self._keys.insert(i, key)
+            self._rows.insert(i, row)
+
+    def add_many(self, dates: Iterable, start_row: int):
+        """افزودن گروهی تاریخ ردیف‌های start_row به بعد"""
+        pairs = [(key, row) for row, key in enumerate(map(date_key, dates), start_row) if key is not None]
+        if not pairs:
+            return
+        if any(pairs[i][0] > pairs[i + 1][0] for i in range(len(pairs) - 1)):
+            pairs.sort()
+        if self._keys and pairs[0][0] < self._keys[-1]:
+            # ردیف‌های با تاریخ گذشته پیشوند دسته مرتب‌شده‌اند؛ بقیه فقط به انتها افزوده می‌شوند
+            late = bisect_left(pairs, (self._keys[-1],))
+            if late <= self._INSERT_LIMIT:
+                lo = 0
+                for key, row in pairs[:late]:
+                    lo = bisect_right(self._keys, key, lo)
+                    self._keys.insert(lo, key)
+                    self._rows.insert(lo, row)
+                    lo += 1
+            else:
+                # فقط بخشی از ایندکس که بعد از قدیمی‌ترین تاریخ دسته است با آن ادغام می‌شود
+                i = bisect_right(self._keys, pairs[0][0])
+                tail = list(zip(self._keys[i:], self._rows[i:]))
+                del self._keys[i:]
+                del self._rows[i:]
+                # Timsort دو دنباله مرتب را در زمان خطی ادغام می‌کند
+                merged = tail + pairs[:late]
+                merged.sort()
+                self._keys.extend(key for key, _ in merged)
+                self._rows.extend(row for _, row in merged)
+            pairs = pairs[late:]
+        self._keys.extend(key for key, _ in pairs)
+        self._rows.extend(row for _, row in pairs)
+
+    def remove(self, date, row: int):
+        key = date_key(date)
+        if key is None:
+            return
+        i = bisect_left(self._keys, key)
+        while i < len(self._keys) and self._keys[i] == key:
+            if self._rows[i] == row:
+                del self._keys[i]
+                del self._rows[i]
+                return
+            i += 1
+
+    def rows_between(self, start, end) -> array:
+        """ردیف‌های با تاریخ در بازه [start, end] به ترتیب تاریخ"""
+        lo = bisect_left(self._keys, date_key(start))
+        hi = bisect_right(self._keys, date_key(end))
+        return self._rows[lo:hi]
+
+    def rows_since(self, since) -> Iterator[int]:
+        """ردیف‌های با تاریخ بزرگ‌تر یا مساوی since به ترتیب تاریخ"""
+        for i in range(bisect_left(self._keys, date_key(since)), len(self._rows)):
+            yield self._rows[i]
+
+
+class FillRatioIndex:
+    """کالاها مرتب بر اساس نسبت موجودی به ظرفیت؛ جستجوی آستانه‌ها با bisect"""
+    def __init__(self):
+        self._keys: List[Tuple[float, int]] = []  # (نسبت پرشدگی، ترتیب کالا)
+        self._codes: List[object] = []
+        self._key_by_code: Dict[object, Tuple[float, int]] = {}
+
+    def update(self, code, ratio: float, order: int):
+        """درج یا جابه‌جایی کالا پس از تغییر موجودی یا ظرفیت"""
+        self.remove(code)
+        key = (ratio, order)
+        i = bisect_left(self._keys, key)
+        self._keys.insert(i, key)
+        self._codes.insert(i, code)
+        self._key_by_code[code] = key
+
+    def remove(self, code):
+        key = self._key_by_code.pop(code, None)
+        if key is not None:
+            i = bisect_left(self._keys, key)
+            del self._keys[i]
+            del self._codes[i]
+
+    def lowest(self, n: int) -> List[object]:
+        """کدهای n کالا با کمترین نسبت پرشدگی"""
+        return self._codes[:n]
+
+    def count_below(self, ratio: float) -> int:
+        """تعداد کالاهای با نسبت کمتر از ratio"""
+        return bisect_left(self._keys, (ratio,))
+
+    def codes_between(self, low: float, high: float) -> List[object]:
+        """کدهای کالاهای با نسبت در بازه [low, high]"""
+        return self._codes[bisect_left(self._keys, (low,)):bisect_right(self._keys, (high, float('inf')))]
+
+    def codes_above(self, ratio: float) -> List[object]:
+        """کدهای کالاهای با نسبت بیشتر از ratio"""
+        return self._codes[bisect_right(self._keys, (ratio, float('inf'))):]
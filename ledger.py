@@ -0,0 +1,159 @@
+import numpy as np
+from typing import Dict, Iterable, List
+from models import Transaction
+
+# دفتر تراکنش ستونی مبتنی بر آرایه‌های NumPy
+
+class _InternTable:
+    """جدول یکتاسازی رشته‌ها به شناسه‌های عددی"""
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def encode(self, value) -> int:
+        code = self.ids.get(value)
+        if code is None:
+            code = len(self.values)
+            self.ids[value] = code
+            self.values.append(value)
+        return code
+
+    def decode(self, code: int):
+        return self.values[code]
+
+
+class ColumnarLedger:
+    """نگهداری تراکنش‌ها به صورت ستونی؛ شیء Transaction فقط هنگام نیاز ساخته می‌شود"""
+    _INITIAL_CAPACITY = 1024
+
+    def __init__(self):
+        self._size = 0
+        self._product_codes = _InternTable()
+        self._types = _InternTable()
+        self._users = _InternTable()
+        self._allocate(self._INITIAL_CAPACITY)
+
+    def _allocate(self, capacity: int):
+        """تخصیص (یا بزرگ کردن) آرایه‌های ستونی"""
+        columns = {
+            '_code_ids': np.empty(capacity, dtype=np.int32),
+            '_type_ids': np.empty(capacity, dtype=np.int8),
+            '_quantities': np.empty(capacity, dtype=np.int64),
+            '_dates': np.empty(capacity, dtype='datetime64[us]'),
+            '_user_ids': np.empty(capacity, dtype=np.int32),
+        }
+        for name, column in columns.items():
+            if self._size:
+                column[:self._size] = getattr(self, name)[:self._size]
+            setattr(self, name, column)
+        self._capacity = capacity
+
+    def _reserve(self, extra: int):
+        needed = self._size + extra
+        if needed > self._capacity:
+            capacity = self._capacity
+            while capacity < needed:
+                capacity *= 2
+            self._allocate(capacity)
+
+    def append(self, transaction: Transaction):
+        self._reserve(1)
+        i = self._size
+        self._code_ids[i] = self._product_codes.encode(transaction.product_code)
+        self._type_ids[i] = self._types.encode(transaction.transaction_type)
+        self._quantities[i] = transaction.quantity
+        self._dates[i] = np.datetime64(transaction.date, 'us')
+        self._user_ids[i] = self._users.encode(transaction.user)
+        self._size += 1
+
+    def extend(self, transactions: Iterable[Transaction]):
+        transactions = list(transactions)
+        count = len(transactions)
+        if not count:
+            return
+        self._reserve(count)
+        start, end = self._size, self._size + count
+        self._code_ids[start:end] = [self._product_codes.encode(t.product_code) for t in transactions]
+        self._type_ids[start:end] = [self._types.encode(t.transaction_type) for t in transactions]
+        self._quantities[start:end] = [t.quantity for t in transactions]
+        self._dates[start:end] = np.array([t.date for t in transactions], dtype='datetime64[us]')
+        self._user_ids[start:end] = [self._users.encode(t.user) for t in transactions]
+        self._size = end
+
+    def pop(self) -> Transaction:
+        """حذف و برگرداندن آخرین ردیف"""
+        if not self._size:
+            raise IndexError('دفتر خالی است')
+        transaction = self._materialize(self._size - 1)
+        self._size -= 1
+        return transaction
+
+    def _materialize(self, i: int) -> Transaction:
+        return Transaction(
+            product_code=self._product_codes.decode(self._code_ids[i]),
+            transaction_type=self._types.decode(self._type_ids[i]),
+            quantity=int(self._quantities[i]),
+            date=self._dates[i].item(),
+            user=self._users.decode(self._user_ids[i])
+        )
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._materialize(i) for i in range(*index.indices(self._size))]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError('شماره تراکنش خارج از محدوده است')
+        return self._materialize(index)
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self._materialize(i)
+
+    def __bool__(self):
+        return self._size > 0
+
+    def copy(self) -> 'ColumnarLedger':
+        """رونوشت مستقل از ردیف‌های فعلی (برای snapshot)"""
+        clone = ColumnarLedger.__new__(ColumnarLedger)
+        clone._size = self._size
+        clone._capacity = max(self._size, 1)
+        for name in ('_code_ids', '_type_ids', '_quantities', '_dates', '_user_ids'):
+            setattr(clone, name, getattr(self, name)[:clone._capacity].copy())
+        for name in ('_product_codes', '_types', '_users'):
+            table = _InternTable()
+            table.ids = dict(getattr(self, name).ids)
+            table.values = list(getattr(self, name).values)
+            setattr(clone, name, table)
+        return clone
+
+    # تجمیع‌های برداری برای گزارش‌ها
+
+    def _signed_quantities(self) -> np.ndarray:
+        """مقادیر با علامت: ورود مثبت، خروج منفی، سایر انواع صفر"""
+        signs = np.zeros(len(self._types.values), dtype=np.int64)
+        if 'ورود' in self._types.ids:
+            signs[self._types.ids['ورود']] = 1
+        if 'خروج' in self._types.ids:
+            signs[self._types.ids['خروج']] = -1
+        return self._quantities[:self._size] * signs[self._type_ids[:self._size]]
+
+    def net_quantity_by_product(self) -> Dict[str, int]:
+        """جمع خالص ورود منهای خروج برای هر کد کالا"""
+        totals = np.bincount(self._code_ids[:self._size], weights=self._signed_quantities(),
+                             minlength=len(self._product_codes.values))
+        return {code: int(total) for code, total in zip(self._product_codes.values, totals)}
+
+    def quantity_by_type(self) -> Dict[str, int]:
+        """جمع مقدار به تفکیک نوع تراکنش"""
+        totals = np.bincount(self._type_ids[:self._size], weights=self._quantities[:self._size],
+                             minlength=len(self._types.values))
+        return {kind: int(total) for kind, total in zip(self._types.values, totals)}
+
+    def memory_usage(self) -> int:
+        """حجم تقریبی آرایه‌های ستونی به بایت"""
+        return sum(column[:self._size].nbytes for column in
+                   (self._code_ids, self._type_ids, self._quantities, self._dates, self._user_ids))
@@ -0,0 +1,88 @@
+import threading
+from contextlib import contextmanager, nullcontext
+
+# قفل خواننده/نویسنده برای دسترسی هم‌زمان نخ‌های پس‌زمینه به DataManager
+
+class ReadWriteLock:
+    """چند خواننده هم‌زمان یا یک نویسنده؛ نویسنده‌ها اولویت دارند و قفل نوشتن بازگشتی است"""
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._write_depth = 0
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    def _held_reads(self):
+        # برای هر خواندن باز این نخ: آیا در شمارش خواننده‌ها لحاظ شده است
+        if not hasattr(self._local, 'reads'):
+            self._local.reads = []
+        return self._local.reads
+
+    def acquire_read(self):
+        me = threading.get_ident()
+        reads = self._held_reads()
+        with self._cond:
+            if self._writer == me or any(reads):
+                # نویسنده فعلی یا خواننده فعلی بدون انتظار دوباره می‌خواند
+                reads.append(False)
+                return
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+            reads.append(True)
+
+    def release_read(self):
+        counted = self._held_reads().pop()
+        if counted:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._write_depth += 1
+                return
+            if any(self._held_reads()):
+                raise RuntimeError('ارتقای قفل خواندن به نوشتن پشتیبانی نمی‌شود')
+            self._waiting_writers += 1
+            while self._writer is not None or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = me
+            self._write_depth = 1
+
+    def release_write(self):
+        with self._cond:
+            self._write_depth -= 1
+            if self._write_depth == 0:
+                self._writer = None
+                self._cond.notify_all()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class NullLock:
+    """قفل بدون اثر برای حالت تک‌نخی"""
+    def read(self):
+        return nullcontext()
+
+    def write(self):
+        return nullcontext()
@@ -18,8 +18,8 @@ if __name__ == '__main__':
     font.setPointSize(10)
     app.setFont(font)
 
-    # ایجاد نمونه مدیریت داده
-    data_manager = DataManager()
+    # ایجاد نمونه مدیریت داده؛ ذخیره‌ها در نخ پس‌زمینه از snapshot انجام می‌شوند
+    data_manager = DataManager(thread_safe=True)
 
     # ایجاد پنجره اصلی
     window = MainWindow(data_manager)
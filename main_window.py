@@ -3,32 +3,62 @@ from PyQt6.QtWidgets import (
 QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
 QLabel, QTableWidget, QTableWidgetItem, QLineEdit, QComboBox, QFormLayout,
 QDialog, QSpinBox, QDateTimeEdit, QTextEdit, QSplitter, QStackedWidget,
-QMessageBox, QStatusBar, QHeaderView, QFrame
+QMessageBox, QStatusBar, QHeaderView, QFrame, QProgressBar
 )
-from PyQt6.QtCore import Qt, QTimer, pyqtSignal, QDateTime
-from PyQt6.QtGui import QFont, QColor, QPixmap
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal, QDateTime, QObject, QRunnable, QThreadPool
+from PyQt6.QtGui import QFont, QColor, QPixmap, QShortcut, QKeySequence
 import matplotlib.pyplot as plt
 import matplotlib
 matplotlib.use('QtAgg')  # استفاده از QtAgg backend برای PyQt6
 
 from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
-from models import Product, Transaction, User, DataManager
+from models import Product, Transaction, User, DataManager, ChangeKind
 from utils import (
-    load_products_from_excel, save_products_to_excel,
-    load_transactions_from_excel, save_transactions_to_excel,
-    load_users_from_excel, save_users_to_excel,
-    validate_product, validate_transaction
+    save_products_to_excel, save_transactions_to_excel, save_users_to_excel,
+    open_store, validate_product, validate_transaction
 )
 
+class SaveSignals(QObject):
+    """سیگنال‌های اتمام ذخیره که در نخ رابط کاربری دریافت می‌شوند"""
+    finished = pyqtSignal(str, bool)  # مجموعه داده، آیا فایل نوشته شد
+    failed = pyqtSignal(str, str)  # مجموعه داده، پیام خطا
+
+class SaveTask(QRunnable):
+    """ذخیره یک مجموعه داده از snapshot در نخ پس‌زمینه"""
+    def __init__(self, dataset, save_function, snapshot):
+        super().__init__()
+        self.dataset = dataset
+        self.save_function = save_function
+        self.snapshot = snapshot
+        self.signals = SaveSignals()
+
+    def run(self):
+        try:
+            written = self.save_function(self.snapshot)
+        except Exception as e:
+            self.signals.failed.emit(self.dataset, str(e))
+        else:
+            self.signals.finished.emit(self.dataset, bool(written))
+
 class MainWindow(QMainWindow):
+    # نام فارسی مجموعه داده‌ها برای پیام‌های ذخیره
+    DATASET_LABELS = {'products': 'کالاها', 'transactions': 'تراکنش‌ها', 'users': 'کاربران'}
+
     def __init__(self, data_manager, current_user=None):
         super().__init__()
         self.data_manager = data_manager
         self.current_user = current_user
         self.restart_requested = False
+        self.product_rows = {}  # شماره ردیف هر کد کالا در جدول
+        self.hidden_product_codes = set()  # کدهایی که ردیفشان با فیلتر جستجو پنهان شده است
+        # ذخیره‌های در جریان و درخواست‌های ادغام‌شده‌ای که پس از آن‌ها اجرا می‌شوند
+        self.save_pool = QThreadPool(self)
+        self.active_saves = {}
+        self.pending_saves = {}
         self.init_ui()
-        self.load_data()  # بارگذاری داده‌ها از فایل‌های Excel
+        self.load_data()  # بارگذاری داده‌ها از پایگاه داده
+        self.data_manager.subscribe(self.on_data_changed)
 
     def init_ui(self):
         """راه‌اندازی رابط کاربری مدرن"""
@@ -261,6 +291,15 @@ class MainWindow(QMainWindow):
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
         self.status_bar.showMessage('🚀 سیستم انبارداری مدرن آماده است!')
+        self.save_progress = QProgressBar()
+        self.save_progress.setRange(0, 0)  # نمایش در حال انجام بدون درصد
+        self.save_progress.setMaximumWidth(150)
+        self.save_progress.hide()
+        self.status_bar.addPermanentWidget(self.save_progress)
+
+        # میانبرهای بازگردانی و انجام مجدد
+        QShortcut(QKeySequence.StandardKey.Undo, self, activated=self.undo_last_action)
+        QShortcut(QKeySequence.StandardKey.Redo, self, activated=self.redo_last_action)
 
         # تنظیم نسبت‌ها
         splitter.setSizes([280, 1120])
@@ -586,14 +625,20 @@ class MainWindow(QMainWindow):
 
     def update_modern_dashboard_stats(self):
         """به‌روزرسانی آمار داشبورد مدرن"""
-        products = self.data_manager.get_products()
-        transactions = self.data_manager.get_transactions()
+        self.update_stats_cards()
+
+        # به‌روزرسانی چارت‌ها
+        self.update_dashboard_charts()
+
+    def update_stats_cards(self):
+        """به‌روزرسانی کارت‌های آماری از آمار تجمیعی DataManager"""
+        stats = self.data_manager.get_stats()
 
         stats_values = {
-            "total_products": len(products),
-            "total_transactions": len(transactions),
-            "total_stock": sum(p.current_stock for p in products),
-            "low_stock": len([p for p in products if p.current_stock < 10])
+            "total_products": stats.total_products,
+            "total_transactions": stats.total_transactions,
+            "total_stock": stats.total_stock,
+            "low_stock": stats.low_stock
         }
 
         stats_descriptions = {
@@ -612,9 +657,6 @@ class MainWindow(QMainWindow):
             if desc_label:
                 desc_label.setText(stats_descriptions.get(data_type, ""))
 
-        # به‌روزرسانی چارت‌ها
-        self.update_dashboard_charts()
-
     def logout(self):
         """خروج از سیستم و بازگشت به صفحه لاگین"""
         reply = QMessageBox.question(
@@ -627,10 +669,9 @@ class MainWindow(QMainWindow):
         if reply == QMessageBox.StandardButton.Yes:
             self.restart_requested = True
             self.hide()
-            # ذخیره داده‌ها هنگام خروج
-            save_products_to_excel(self.data_manager)
-            save_transactions_to_excel(self.data_manager)
-            save_users_to_excel(self.data_manager)
+            # تغییرات هنگام وقوع در پایگاه داده ثبت شده‌اند
+            self.save_pool.waitForDone()
+            self.store.close()
 
     def update_dashboard_charts(self):
         """به‌روزرسانی چارت‌های داشبورد"""
@@ -775,11 +816,21 @@ class MainWindow(QMainWindow):
         refresh_btn.setStyleSheet("QPushButton { background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 #8b5cf6, stop:1 #7c3aed); }")
 
         save_btn = QPushButton('💾 ذخیره به Excel')
-        save_btn.clicked.connect(lambda: save_products_to_excel(self.data_manager))
+        save_btn.clicked.connect(lambda: self.save_in_background('products', save_products_to_excel))
+
+        undo_btn = QPushButton('↩️ بازگردانی')
+        undo_btn.setToolTip('بازگردانی آخرین تغییر (Ctrl+Z)')
+        undo_btn.clicked.connect(self.undo_last_action)
+
+        redo_btn = QPushButton('↪️ انجام مجدد')
+        redo_btn.setToolTip('انجام مجدد تغییر بازگردانده‌شده (Ctrl+Y)')
+        redo_btn.clicked.connect(self.redo_last_action)
 
         button_group.addWidget(add_btn)
         button_group.addWidget(edit_btn)
         button_group.addWidget(delete_btn)
+        button_group.addWidget(undo_btn)
+        button_group.addWidget(redo_btn)
         button_group.addWidget(refresh_btn)
         button_group.addWidget(save_btn)
         button_group.addStretch()
@@ -805,113 +856,194 @@ class MainWindow(QMainWindow):
     def refresh_products_table(self):
         """به‌روزرسانی جدول کالاها مدرن با امکان تنظیم سریع تعداد"""
         products = self.data_manager.get_products()
+        self.show_products_in_table(products)
+
+        # اعمال فیلتر جستجو و به‌روزرسانی آمار
+        self.filter_products_table()
+
+    def show_products_in_table(self, products):
+        """نمایش فهرست کالاها در جدول و ثبت شماره ردیف هر کد"""
+        for code in self.hidden_product_codes:
+            row = self.product_rows.get(code)
+            if row is not None:
+                self.products_table.setRowHidden(row, False)
+        self.hidden_product_codes = set()
         self.products_table.setRowCount(len(products))
-
+        self.product_rows = {}
         for row, product in enumerate(products):
-            # کد
-            code_item = QTableWidgetItem(product.code)
-            code_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.products_table.setItem(row, 0, code_item)
-
-            # نام
-            name_item = QTableWidgetItem(product.name)
-            self.products_table.setItem(row, 1, name_item)
-
-            # دسته‌بندی
-            category_item = QTableWidgetItem(product.category)
-            self.products_table.setItem(row, 2, category_item)
-
-            # ظرفیت
-            capacity_item = QTableWidgetItem(str(product.capacity))
-            capacity_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.products_table.setItem(row, 3, capacity_item)
-
-            # موجودی فعلی
-            stock_item = QTableWidgetItem(str(product.current_stock))
-            stock_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.products_table.setItem(row, 4, stock_item)
-
-            # وضعیت
-            status_item = self.create_status_indicator(product)
-            self.products_table.setItem(row, 5, status_item)
-
-            # دکمه کاهش
-            decrease_btn = QPushButton("➖")
-            decrease_btn.setFixedSize(40, 30)
-            decrease_btn.setStyleSheet("""
-                QPushButton {
-                    background-color: #dc2626;
-                    color: #ffffff;
-                    border: none;
-                    border-radius: 6px;
-                    font-size: 16px;
-                    font-weight: bold;
-                }
-                QPushButton:hover {
-                    background-color: #b91c1c;
-                }
-                QPushButton:pressed {
-                    background-color: #991b1b;
-                }
-                QPushButton:disabled {
-                    background-color: #6b7280;
-                    color: #9ca3af;
-                }
-            """)
-            decrease_btn.clicked.connect(lambda checked, p=product: self.decrease_product_stock(p))
+            self.fill_product_row(row, product)
+            self.product_rows[product.code] = row
+
+    def fill_product_row(self, row, product):
+        """پر کردن یک ردیف جدول کالاها"""
+        # کد
+        code_item = QTableWidgetItem(product.code)
+        code_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.products_table.setItem(row, 0, code_item)
+
+        # نام
+        name_item = QTableWidgetItem(product.name)
+        self.products_table.setItem(row, 1, name_item)
+
+        # دسته‌بندی
+        category_item = QTableWidgetItem(product.category)
+        self.products_table.setItem(row, 2, category_item)
+
+        # ظرفیت
+        capacity_item = QTableWidgetItem(str(product.capacity))
+        capacity_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.products_table.setItem(row, 3, capacity_item)
+
+        # موجودی فعلی
+        stock_item = QTableWidgetItem(str(product.current_stock))
+        stock_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.products_table.setItem(row, 4, stock_item)
+
+        # وضعیت
+        status_item = self.create_status_indicator(product)
+        self.products_table.setItem(row, 5, status_item)
+
+        # دکمه کاهش
+        decrease_btn = QPushButton("➖")
+        decrease_btn.setFixedSize(40, 30)
+        decrease_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #dc2626;
+                color: #ffffff;
+                border: none;
+                border-radius: 6px;
+                font-size: 16px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #b91c1c;
+            }
+            QPushButton:pressed {
+                background-color: #991b1b;
+            }
+            QPushButton:disabled {
+                background-color: #6b7280;
+                color: #9ca3af;
+            }
+        """)
+        decrease_btn.clicked.connect(lambda checked, p=product: self.decrease_product_stock(p))
+        decrease_btn.setEnabled(product.current_stock > 0)
+        self.products_table.setCellWidget(row, 6, decrease_btn)
+
+        # دکمه افزایش
+        increase_btn = QPushButton("➕")
+        increase_btn.setFixedSize(40, 30)
+        increase_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #059669;
+                color: #ffffff;
+                border: none;
+                border-radius: 6px;
+                font-size: 16px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #047857;
+            }
+            QPushButton:pressed {
+                background-color: #065f46;
+            }
+        """)
+        increase_btn.clicked.connect(lambda checked, p=product: self.increase_product_stock(p))
+        self.products_table.setCellWidget(row, 7, increase_btn)
+
+    def update_product_stock_cells(self, row, product):
+        """به‌روزرسانی فقط ستون‌های موجودی و وضعیت یک ردیف"""
+        stock_item = QTableWidgetItem(str(product.current_stock))
+        stock_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.products_table.setItem(row, 4, stock_item)
+        self.products_table.setItem(row, 5, self.create_status_indicator(product))
+        decrease_btn = self.products_table.cellWidget(row, 6)
+        if decrease_btn:
             decrease_btn.setEnabled(product.current_stock > 0)
-            self.products_table.setCellWidget(row, 6, decrease_btn)
-
-            # دکمه افزایش
-            increase_btn = QPushButton("➕")
-            increase_btn.setFixedSize(40, 30)
-            increase_btn.setStyleSheet("""
-                QPushButton {
-                    background-color: #059669;
-                    color: #ffffff;
-                    border: none;
-                    border-radius: 6px;
-                    font-size: 16px;
-                    font-weight: bold;
-                }
-                QPushButton:hover {
-                    background-color: #047857;
-                }
-                QPushButton:pressed {
-                    background-color: #065f46;
-                }
-            """)
-            increase_btn.clicked.connect(lambda checked, p=product: self.increase_product_stock(p))
-            self.products_table.setCellWidget(row, 7, increase_btn)
 
-        # به‌روزرسانی آمار
-        self.update_products_stats(products)
+    def on_data_changed(self, events):
+        """به‌روزرسانی افزایشی جدول‌ها بر اساس رویدادهای DataManager"""
+        products_changed = False
+        for event in events:
+            if event.kind is ChangeKind.PRODUCT_ADDED:
+                products_changed = True
+                product = self.data_manager.get_product_by_code(event.key)
+                if product is None:
+                    continue
+                # کالای بازگردانده‌شده با undo به جای قبلی خود در فهرست برمی‌گردد
+                row = self.data_manager.get_product_position(product.code)
+                if row is None or row >= self.products_table.rowCount():
+                    row = self.products_table.rowCount()
+                else:
+                    for code, other_row in self.product_rows.items():
+                        if other_row >= row:
+                            self.product_rows[code] = other_row + 1
+                self.products_table.insertRow(row)
+                self.fill_product_row(row, product)
+                self.product_rows[product.code] = row
+            elif event.kind is ChangeKind.PRODUCT_UPDATED:
+                products_changed = True
+                row = self.product_rows.pop(event.old_key, None)
+                product = self.data_manager.get_product_by_code(event.key)
+                if row is not None and product is not None:
+                    self.fill_product_row(row, product)
+                    self.product_rows[product.code] = row
+            elif event.kind is ChangeKind.PRODUCT_REMOVED:
+                products_changed = True
+                row = self.product_rows.pop(event.key, None)
+                if row is not None:
+                    self.products_table.removeRow(row)
+                    for code, other_row in self.product_rows.items():
+                        if other_row > row:
+                            self.product_rows[code] = other_row - 1
+            elif event.kind is ChangeKind.STOCK_CHANGED:
+                products_changed = True
+                row = self.product_rows.get(event.key)
+                product = self.data_manager.get_product_by_code(event.key)
+                if row is not None and product is not None:
+                    self.update_product_stock_cells(row, product)
+            elif event.kind is ChangeKind.TRANSACTIONS_APPENDED:
+                self.append_transaction_rows(event.rows)
+                self.update_stats_cards()
+            elif event.kind is ChangeKind.TRANSACTION_REMOVED:
+                self.transactions_table.setRowCount(len(self.data_manager.get_transactions()))
+                self.update_stats_cards()
+            elif event.kind is ChangeKind.USER_ADDED:
+                self.append_user_rows()
+
+        if products_changed:
+            if self.search_input.text():
+                self.filter_products_table()
+            else:
+                self.update_products_stats()
+            self.update_stats_cards()
 
     def create_status_indicator(self, product):
-        """ایجاد نشانگر وضعیت محصول"""
-        if product.current_stock == 0:
-            status = "❌ خالی"
-            color = "#ef4444"
-        elif product.current_stock < product.capacity * 0.1:
-            status = "⚠️ کم"
-            color = "#f59e0b"
-        elif product.current_stock > product.capacity * 0.9:
-            status = "📦 پر"
-            color = "#10b981"
-        else:
-            status = "✅ نرمال"
-            color = "#3b82f6"
+        """ایجاد نشانگر وضعیت محصول بر اساس سیاست موجودی DataManager"""
+        status, color = {
+            'empty': ("❌ خالی", "#ef4444"),
+            'low': ("⚠️ کم", "#f59e0b"),
+            'full': ("📦 پر", "#10b981"),
+            'normal': ("✅ نرمال", "#3b82f6"),
+        }[self.data_manager.stock_policy.classify(product)]
 
         status_item = QTableWidgetItem(status)
         status_item.setBackground(QColor(color))
         status_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
         return status_item
 
-    def update_products_stats(self, products):
-        """به‌روزرسانی آمار محصولات"""
-        total_products = len(products)
-        total_stock = sum(p.current_stock for p in products)
-        total_capacity = sum(p.capacity for p in products)
+    def update_products_stats(self, products=None):
+        """به‌روزرسانی آمار محصولات؛ بدون فهرست، آمار تجمیعی کل انبار نمایش داده می‌شود"""
+        if products is None:
+            stats = self.data_manager.get_stats()
+            total_products = stats.total_products
+            total_stock = stats.total_stock
+            total_capacity = stats.total_capacity
+        else:
+            total_products = len(products)
+            total_stock = sum(p.current_stock for p in products)
+            total_capacity = sum(p.capacity for p in products)
 
         if hasattr(self, 'products_count_label'):
             self.products_count_label.setText(f"📊 {total_products} کالا")
@@ -920,100 +1052,23 @@ class MainWindow(QMainWindow):
             self.products_stock_label.setText(f"📈 موجودی کل: {total_stock}/{total_capacity}")
 
     def filter_products_table(self):
-        """فیلتر کردن جدول محصولات با ساختار جدید"""
-        search_text = self.search_input.text().lower()
-        products = self.data_manager.get_products()
+        """فیلتر کردن جدول محصولات با پنهان کردن ردیف‌ها بر اساس ایندکس جستجو"""
+        search_text = self.search_input.text()
+        if search_text:
+            filtered_products = self.data_manager.search_products(search_text)
+            hidden = self.product_rows.keys() - {p.code for p in filtered_products}
+        else:
+            filtered_products = None
+            hidden = set()
 
-        filtered_products = []
-        for product in products:
-            search_target = f"{product.code} {product.name} {product.category}".lower()
-            if search_text in search_target:
-                filtered_products.append(product)
-
-        # نمایش محصولات فیلتر شده با ساختار جدید
-        self.products_table.setRowCount(len(filtered_products))
-        for row, product in enumerate(filtered_products):
-            # کد
-            code_item = QTableWidgetItem(product.code)
-            code_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.products_table.setItem(row, 0, code_item)
-
-            # نام
-            name_item = QTableWidgetItem(product.name)
-            self.products_table.setItem(row, 1, name_item)
-
-            # دسته‌بندی
-            category_item = QTableWidgetItem(product.category)
-            self.products_table.setItem(row, 2, category_item)
-
-            # ظرفیت
-            capacity_item = QTableWidgetItem(str(product.capacity))
-            capacity_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.products_table.setItem(row, 3, capacity_item)
-
-            # موجودی فعلی
-            stock_item = QTableWidgetItem(str(product.current_stock))
-            stock_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.products_table.setItem(row, 4, stock_item)
-
-            # وضعیت
-            status_item = self.create_status_indicator(product)
-            self.products_table.setItem(row, 5, status_item)
-
-            # پاک کردن دکمه‌های قبلی
-            self.products_table.setCellWidget(row, 6, None)
-            self.products_table.setCellWidget(row, 7, None)
-
-            # دکمه کاهش
-            decrease_btn = QPushButton("➖")
-            decrease_btn.setFixedSize(40, 30)
-            decrease_btn.setStyleSheet("""
-                QPushButton {
-                    background-color: #dc2626;
-                    color: #ffffff;
-                    border: none;
-                    border-radius: 6px;
-                    font-size: 16px;
-                    font-weight: bold;
-                }
-                QPushButton:hover {
-                    background-color: #b91c1c;
-                }
-                QPushButton:pressed {
-                    background-color: #991b1b;
-                }
-                QPushButton:disabled {
-                    background-color: #6b7280;
-                    color: #9ca3af;
-                }
-            """)
-            decrease_btn.clicked.connect(lambda checked, p=product: self.decrease_product_stock(p))
-            decrease_btn.setEnabled(product.current_stock > 0)
-            self.products_table.setCellWidget(row, 6, decrease_btn)
-
-            # دکمه افزایش
-            increase_btn = QPushButton("➕")
-            increase_btn.setFixedSize(40, 30)
-            increase_btn.setStyleSheet("""
-                QPushButton {
-                    background-color: #059669;
-                    color: #ffffff;
-                    border: none;
-                    border-radius: 6px;
-                    font-size: 16px;
-                    font-weight: bold;
-                }
-                QPushButton:hover {
-                    background-color: #047857;
-                }
-                QPushButton:pressed {
-                    background-color: #065f46;
-                }
-            """)
-            increase_btn.clicked.connect(lambda checked, p=product: self.increase_product_stock(p))
-            self.products_table.setCellWidget(row, 7, increase_btn)
+        # setRowHidden روی هر ردیف کند است؛ فقط ردیف‌هایی که وضعیت نمایششان عوض شده تغییر می‌کنند
+        for code in hidden ^ self.hidden_product_codes:
+            row = self.product_rows.get(code)
+            if row is not None:
+                self.products_table.setRowHidden(row, code in hidden)
+        self.hidden_product_codes = hidden
 
-        # به‌روزرسانی آمار برای محصولات فیلتر شده
+        # به‌روزرسانی آمار برای محصولات فیلتر شده (بدون فیلتر: آمار کل انبار)
         self.update_products_stats(filtered_products)
 
     def add_product(self):
@@ -1021,12 +1076,12 @@ class MainWindow(QMainWindow):
         if dialog.exec() == QDialog.DialogCode.Accepted:
             product = Product(dialog.code.text(), dialog.name.text(), dialog.category.text(),
                               dialog.capacity.value(), 0)
-            if validate_product(product):
-                self.data_manager.add_product(product)
-                self.refresh_products_table()
+            if not validate_product(product):
+                QMessageBox.warning(self, 'خطا', 'داده‌های کالا نامعتبر است.')
+            elif self.data_manager.add_product(product):
                 self.status_bar.showMessage('کالا اضافه شد.')
             else:
-                QMessageBox.warning(self, 'خطا', 'داده‌های کالا نامعتبر است.')
+                QMessageBox.warning(self, 'خطا', f'کالایی با کد {product.code} قبلاً ثبت شده است.')
 
     def edit_product(self):
         """ویرایش کالا انتخاب‌شده"""
@@ -1034,7 +1089,7 @@ class MainWindow(QMainWindow):
         if selected_row < 0:
             QMessageBox.warning(self, 'خطا', 'هیچ کالایی انتخاب نشده است.')
             return
-        product = self.data_manager.get_products()[selected_row]
+        product = self.data_manager.get_product_by_code(self.products_table.item(selected_row, 0).text())
         dialog = ProductDialog()
         dialog.code.setText(product.code)
         dialog.name.setText(product.name)
@@ -1043,12 +1098,12 @@ class MainWindow(QMainWindow):
         if dialog.exec() == QDialog.DialogCode.Accepted:
             updated_product = Product(dialog.code.text(), dialog.name.text(), dialog.category.text(),
                                       dialog.capacity.value(), product.current_stock)
-            if validate_product(updated_product):
-                self.data_manager.update_product(product.code, updated_product)
-                self.refresh_products_table()
+            if not validate_product(updated_product):
+                QMessageBox.warning(self, 'خطا', 'داده‌های کالا نامعتبر است.')
+            elif self.data_manager.update_product(product.code, updated_product):
                 self.status_bar.showMessage('کالا ویرایش شد.')
             else:
-                QMessageBox.warning(self, 'خطا', 'داده‌های کالا نامعتبر است.')
+                QMessageBox.warning(self, 'خطا', f'کالایی با کد {updated_product.code} قبلاً ثبت شده است.')
 
     def delete_product(self):
         """حذف کالا انتخاب‌شده"""
@@ -1056,12 +1111,11 @@ class MainWindow(QMainWindow):
         if selected_row < 0:
             QMessageBox.warning(self, 'خطا', 'هیچ کالایی انتخاب نشده است.')
             return
-        product = self.data_manager.get_products()[selected_row]
+        product = self.data_manager.get_product_by_code(self.products_table.item(selected_row, 0).text())
         reply = QMessageBox.question(self, 'تأیید', f'آیا مطمئن هستید که می‌خواهید کالا {product.name} را حذف کنید؟',
                                      QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         if reply == QMessageBox.StandardButton.Yes:
             self.data_manager.delete_product(product.code)
-            self.refresh_products_table()
             self.status_bar.showMessage('کالا حذف شد.')
 
     def create_modern_transactions_page(self):
@@ -1101,7 +1155,7 @@ class MainWindow(QMainWindow):
         add_btn.setStyleSheet("QPushButton { background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 #10b981, stop:1 #059669); }")
 
         save_btn = QPushButton('💾 ذخیره به Excel')
-        save_btn.clicked.connect(lambda: save_transactions_to_excel(self.data_manager))
+        save_btn.clicked.connect(lambda: self.save_in_background('transactions', save_transactions_to_excel))
 
         btn_layout.addWidget(add_btn)
         btn_layout.addWidget(save_btn)
@@ -1116,17 +1170,29 @@ class MainWindow(QMainWindow):
         transactions = self.data_manager.get_transactions()
         self.transactions_table.setRowCount(len(transactions))
         for row, transaction in enumerate(transactions):
-            self.transactions_table.setItem(row, 0, QTableWidgetItem(transaction.product_code))
-            self.transactions_table.setItem(row, 1, QTableWidgetItem(transaction.transaction_type))
-            self.transactions_table.setItem(row, 2, QTableWidgetItem(str(transaction.quantity)))
-            self.transactions_table.setItem(row, 3, QTableWidgetItem(transaction.date.strftime('%Y-%m-%d %H:%M')))
-            self.transactions_table.setItem(row, 4, QTableWidgetItem(transaction.user))
+            self.fill_transaction_row(row, transaction)
 
         # تنظیم اندازه ستون‌ها
         self.transactions_table.resizeColumnsToContents()
         if transactions:
             self.transactions_table.horizontalHeader().setStretchLastSection(True)
 
+    def fill_transaction_row(self, row, transaction):
+        """پر کردن یک ردیف جدول تراکنش‌ها"""
+        self.transactions_table.setItem(row, 0, QTableWidgetItem(transaction.product_code))
+        self.transactions_table.setItem(row, 1, QTableWidgetItem(transaction.transaction_type))
+        self.transactions_table.setItem(row, 2, QTableWidgetItem(str(transaction.quantity)))
+        self.transactions_table.setItem(row, 3, QTableWidgetItem(transaction.date.strftime('%Y-%m-%d %H:%M')))
+        self.transactions_table.setItem(row, 4, QTableWidgetItem(transaction.user))
+
+    def append_transaction_rows(self, rows):
+        """افزودن ردیف‌های جدید دفتر به انتهای جدول تراکنش‌ها"""
+        transactions = self.data_manager.get_transactions()
+        self.transactions_table.setRowCount(len(transactions))
+        for row in rows:
+            if row < len(transactions):
+                self.fill_transaction_row(row, transactions[row])
+
     def add_transaction(self):
         dialog = TransactionDialog(self.data_manager.get_products())
         if dialog.exec() == QDialog.DialogCode.Accepted:
@@ -1135,7 +1201,6 @@ class MainWindow(QMainWindow):
                                       dialog.date.dateTime().toPyDateTime(), 'مدیر')  # موقت
             if validate_transaction(transaction, self.data_manager.get_products()):
                 self.data_manager.add_transaction(transaction)
-                self.refresh_transactions_table()
                 self.status_bar.showMessage('تراکنش اضافه شد.')
             else:
                 QMessageBox.warning(self, 'خطا', 'داده‌های تراکنش نامعتبر است.')
@@ -1363,7 +1428,7 @@ class MainWindow(QMainWindow):
         delete_btn.setProperty("danger", "true")
 
         save_btn = QPushButton('💾 ذخیره به Excel')
-        save_btn.clicked.connect(lambda: save_users_to_excel(self.data_manager))
+        save_btn.clicked.connect(lambda: self.save_in_background('users', save_users_to_excel))
 
         btn_layout.addWidget(add_btn)
         btn_layout.addWidget(edit_btn)
@@ -1380,21 +1445,32 @@ class MainWindow(QMainWindow):
         users = self.data_manager.get_users()
         self.users_table.setRowCount(len(users))
         for row, user in enumerate(users):
-            self.users_table.setItem(row, 0, QTableWidgetItem(user.username))
-            self.users_table.setItem(row, 1, QTableWidgetItem(user.password))
-            self.users_table.setItem(row, 2, QTableWidgetItem(user.role))
+            self.fill_user_row(row, user)
 
         # تنظیم اندازه ستون‌ها
         self.users_table.resizeColumnsToContents()
         if users:
             self.users_table.horizontalHeader().setStretchLastSection(True)
 
+    def fill_user_row(self, row, user):
+        """پر کردن یک ردیف جدول کاربران"""
+        self.users_table.setItem(row, 0, QTableWidgetItem(user.username))
+        self.users_table.setItem(row, 1, QTableWidgetItem(user.password))
+        self.users_table.setItem(row, 2, QTableWidgetItem(user.role))
+
+    def append_user_rows(self):
+        """افزودن کاربران جدید به انتهای جدول کاربران؛ یک دسته ممکن است چند کاربر اضافه کرده باشد"""
+        users = self.data_manager.get_users()
+        start = self.users_table.rowCount()
+        self.users_table.setRowCount(len(users))
+        for row in range(start, len(users)):
+            self.fill_user_row(row, users[row])
+
     def add_user(self):
         dialog = UserDialog()
         if dialog.exec() == QDialog.DialogCode.Accepted:
             user = User(dialog.username.text(), dialog.password.text(), dialog.role.currentText())
             self.data_manager.add_user(user)
-            self.refresh_users_table()
 
     def edit_user(self):
         """ویرایش کاربر انتخاب‌شده (در نسخه‌های آینده)"""
@@ -1409,17 +1485,10 @@ class MainWindow(QMainWindow):
         try:
             from datetime import datetime
 
-            # افزایش موجودی
-            old_stock = product.current_stock
-            product.current_stock += 1
-
-            # ایجاد تراکنش خودکار برای ثبت تغییر
+            # ثبت تراکنش خودکار؛ موجودی توسط DataManager به‌روز می‌شود
             transaction = Transaction(product.code, 'ورود', 1, datetime.now(), 'تنظیم دستی')
             if validate_transaction(transaction, self.data_manager.get_products()):
                 self.data_manager.add_transaction(transaction)
-
-            # به‌روزرسانی جدول
-            self.refresh_products_table()
             self.status_bar.showMessage(f'📈 موجودی {product.name} به {product.current_stock} افزایش یافت.')
 
         except Exception as e:
@@ -1434,36 +1503,91 @@ class MainWindow(QMainWindow):
                 QMessageBox.information(self, 'اطلاعیه', 'موجودی محصول صفر است و نمی‌توان کاهش داد.')
                 return
 
-            # کاهش موجودی
-            old_stock = product.current_stock
-            product.current_stock -= 1
-
-            # ایجاد تراکنش خودکار برای ثبت تغییر
+            # ثبت تراکنش خودکار؛ موجودی توسط DataManager به‌روز می‌شود
             transaction = Transaction(product.code, 'خروج', 1, datetime.now(), 'تنظیم دستی')
             if validate_transaction(transaction, self.data_manager.get_products()):
                 self.data_manager.add_transaction(transaction)
-
-            # به‌روزرسانی جدول
-            self.refresh_products_table()
             self.status_bar.showMessage(f'📉 موجودی {product.name} به {product.current_stock} کاهش یافت.')
 
         except Exception as e:
             QMessageBox.warning(self, 'خطا', f'امکان کاهش موجودی وجود ندارد:\n{str(e)}')
 
+    def undo_last_action(self):
+        """بازگردانی آخرین تغییر کالا یا موجودی"""
+        if self.data_manager.undo():
+            self.status_bar.showMessage('↩️ آخرین تغییر بازگردانده شد.')
+        else:
+            self.status_bar.showMessage('تغییری برای بازگردانی وجود ندارد.')
+
+    def redo_last_action(self):
+        """انجام دوباره آخرین تغییر بازگردانده‌شده"""
+        if self.data_manager.redo():
+            self.status_bar.showMessage('↪️ تغییر دوباره انجام شد.')
+        else:
+            self.status_bar.showMessage('تغییری برای انجام مجدد وجود ندارد.')
+
+    def save_in_background(self, dataset, save_function):
+        """ذخیره مجموعه داده از snapshot در نخ پس‌زمینه؛ درخواست تکراری در حین ذخیره با درخواست بعدی ادغام می‌شود"""
+        label = self.DATASET_LABELS[dataset]
+        if dataset in self.active_saves:
+            self.pending_saves[dataset] = save_function
+            self.status_bar.showMessage(f'⏳ ذخیره {label} در حال انجام است؛ تغییرات جدید پس از آن ذخیره می‌شوند.')
+            return
+        task = SaveTask(dataset, save_function, self.data_manager.snapshot())
+        task.signals.finished.connect(self.on_save_finished)
+        task.signals.failed.connect(self.on_save_failed)
+        self.active_saves[dataset] = task
+        self.save_progress.show()
+        self.status_bar.showMessage(f'⏳ در حال ذخیره {label}...')
+        self.save_pool.start(task)
+
+    def on_save_finished(self, dataset, written):
+        label = self.DATASET_LABELS[dataset]
+        if written:
+            self.status_bar.showMessage(f'✅ {label} ذخیره شدند.')
+        else:
+            self.status_bar.showMessage(f'تغییری در {label} برای ذخیره وجود ندارد.')
+        self.finish_save(dataset)
+
+    def on_save_failed(self, dataset, message):
+        self.status_bar.showMessage(f'❌ خطا در ذخیره {self.DATASET_LABELS[dataset]}: {message}')
+        self.finish_save(dataset)
+
+    def finish_save(self, dataset):
+        del self.active_saves[dataset]
+        save_function = self.pending_saves.pop(dataset, None)
+        if save_function is not None:
+            self.save_in_background(dataset, save_function)
+        elif not self.active_saves:
+            self.save_progress.hide()
+
     def load_data(self):
-        """بارگذاری داده‌ها از فایل‌های Excel"""
-        load_products_from_excel(self.data_manager)
-        load_transactions_from_excel(self.data_manager)
-        load_users_from_excel(self.data_manager)
+        """بارگذاری داده‌ها از پایگاه داده (در اجرای اول از فایل‌های Excel با نمایش پیشرفت)"""
+        self.store = open_store(self.data_manager, progress=self.show_import_progress)
+        self.save_progress.setRange(0, 0)
+        self.save_progress.hide()
+
+    def show_import_progress(self, loaded, total):
+        """نمایش پیشرفت ورود اولیه تراکنش‌ها از Excel در نوار وضعیت"""
+        if not self.isVisible():
+            # ورود اولیه پیش از نمایش پنجره در سازنده انجام می‌شود
+            self.show()
+        if total:
+            self.save_progress.setRange(0, total)
+            self.save_progress.setValue(min(loaded, total))
+            self.status_bar.showMessage(f'⏳ ورود تراکنش‌ها از Excel: {loaded} از {total} ردیف')
+        else:
+            self.status_bar.showMessage(f'⏳ ورود تراکنش‌ها از Excel: {loaded} ردیف')
+        self.save_progress.show()
+        QApplication.processEvents()
 
     def closeEvent(self, event):
         """ذخیره داده‌ها هنگام خروج"""
         reply = QMessageBox.question(self, 'خروج', 'آیا می‌خواهید از برنامه خارج شوید؟ داده‌ها ذخیره می‌شوند.',
                                      QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         if reply == QMessageBox.StandardButton.Yes:
-            save_products_to_excel(self.data_manager)
-            save_transactions_to_excel(self.data_manager)
-            save_users_to_excel(self.data_manager)
+            self.save_pool.waitForDone()
+            self.store.close()
             self.status_bar.showMessage('داده‌ها ذخیره شدند. برنامه بسته شد.')
             event.accept()
         else:
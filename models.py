@@ -1,8 +1,22 @@
-from dataclasses import dataclass
-from typing import List
+import os
+import sys
+from array import array
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from enum import Enum
+from functools import wraps
+from typing import Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 from datetime import datetime
+from indexes import GRANULARITIES, DateIndex, FillRatioIndex, TransactionRollups, TrigramIndex
+from locks import NullLock, ReadWriteLock
 
-@dataclass
+def intern_str(value):
+    """یکتاسازی رشته‌های پرتکرار (دسته‌بندی، نوع تراکنش، کاربر) برای کاهش حافظه"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+@dataclass(slots=True)
 class Product:
     """کلاس مدل کالا"""
     code: str
@@ -11,7 +25,7 @@ class Product:
     capacity: int  # ظرفیت انبار
     current_stock: int  # موجودی فعلی
 
-@dataclass
+@dataclass(slots=True)
 class Transaction:
     """کلاس مدل تراکنش"""
     product_code: str
@@ -20,61 +34,743 @@ class Transaction:
     date: datetime
     user: str  # نام کاربر
 
-@dataclass
+@dataclass(slots=True)
 class User:
     """کلاس مدل کاربر"""
     username: str
     password: str  # هش باید بشه اما ساد نگه می‌داریم
     role: str  # مثلاً 'مدیر' یا 'کارمند'
 
+class ChangeKind(Enum):
+    """انواع تغییرات داده که DataManager اعلام می‌کند"""
+    PRODUCT_ADDED = 'product_added'
+    PRODUCT_UPDATED = 'product_updated'
+    PRODUCT_REMOVED = 'product_removed'
+    STOCK_CHANGED = 'stock_changed'
+    TRANSACTIONS_APPENDED = 'transactions_appended'
+    TRANSACTION_REMOVED = 'transaction_removed'
+    USER_ADDED = 'user_added'
+
+@dataclass(frozen=True, slots=True)
+class ChangeEvent:
+    """رویداد تغییر؛ key کد کالا یا نام کاربری است و rows بازه ردیف‌های اضافه‌شده به دفتر"""
+    kind: ChangeKind
+    key: Optional[str] = None
+    old_key: Optional[str] = None  # کد قبلی هنگام تغییر کد کالا
+    rows: Optional[range] = None
+
+def coalesce_events(events: List[ChangeEvent]) -> List[ChangeEvent]:
+    """ادغام رویدادهای تکراری یک دسته: یک تغییر موجودی برای هر کالا و یک بازه برای تراکنش‌ها"""
+    merged: List[ChangeEvent] = []
+    refreshed = set()  # کالاهایی که ردیف کاملشان به‌روز می‌شود
+    append_index = None
+    for event in events:
+        if event.kind is ChangeKind.STOCK_CHANGED:
+            if event.key in refreshed:
+                continue
+            refreshed.add(event.key)
+        elif event.kind in (ChangeKind.PRODUCT_ADDED, ChangeKind.PRODUCT_UPDATED):
+            refreshed.add(event.key)
+        elif event.kind is ChangeKind.TRANSACTIONS_APPENDED:
+            if append_index is not None and merged[append_index].rows.stop == event.rows.start:
+                rows = range(merged[append_index].rows.start, event.rows.stop)
+                merged[append_index] = ChangeEvent(ChangeKind.TRANSACTIONS_APPENDED, rows=rows)
+                continue
+            append_index = len(merged)
+        merged.append(event)
+    return merged
+
+# مجموعه داده‌هایی که جداگانه ذخیره می‌شوند و مجموعه داده متناظر هر نوع رویداد
+DATASETS = ('products', 'transactions', 'users')
+_DATASET_BY_KIND = {
+    ChangeKind.PRODUCT_ADDED: 'products',
+    ChangeKind.PRODUCT_UPDATED: 'products',
+    ChangeKind.PRODUCT_REMOVED: 'products',
+    ChangeKind.STOCK_CHANGED: 'products',
+    ChangeKind.TRANSACTIONS_APPENDED: 'transactions',
+    ChangeKind.TRANSACTION_REMOVED: 'transactions',
+    ChangeKind.USER_ADDED: 'users',
+}
+
+@dataclass(slots=True)
+class StockPolicy:
+    """سیاست واحد طبقه‌بندی موجودی بر اساس نسبت موجودی به ظرفیت"""
+    low_ratio: float = 0.1
+    full_ratio: float = 0.9
+
+    @staticmethod
+    def fill_ratio(product: Product) -> float:
+        if product.capacity > 0:
+            return product.current_stock / product.capacity
+        if product.current_stock == 0:
+            return 0.0
+        return float('inf') if product.current_stock > 0 else float('-inf')
+
+    def classify(self, product: Product) -> str:
+        """وضعیت کالا: 'empty'، 'low'، 'normal' یا 'full'"""
+        if product.current_stock == 0:
+            return 'empty'
+        ratio = self.fill_ratio(product)
+        if ratio < self.low_ratio:
+            return 'low'
+        if ratio > self.full_ratio:
+            return 'full'
+        return 'normal'
+
+@dataclass(slots=True)
+class InventoryStats:
+    """آمار تجمیعی انبار برای داشبورد"""
+    total_products: int = 0
+    total_transactions: int = 0
+    total_stock: int = 0
+    total_capacity: int = 0
+    low_stock: int = 0
+    categories: Dict[str, int] = field(default_factory=dict)
+
+@dataclass(frozen=True, slots=True)
+class DataSnapshot:
+    """نمای فقط‌خواندنی و سازگار از داده‌ها برای نخ‌های پس‌زمینه"""
+    products: Tuple[Product, ...]
+    transactions: Sequence[Transaction]
+    users: Tuple[User, ...]
+    # نسخه هر مجموعه داده هنگام گرفتن snapshot و مجموعه داده‌های ذخیره‌نشده
+    versions: Dict[str, int] = field(default_factory=dict)
+    dirty: FrozenSet[str] = frozenset()
+    source: Optional['DataManager'] = None
+
+    def get_products(self):
+        return self.products
+
+    def get_transactions(self):
+        return self.transactions
+
+    def get_users(self):
+        return self.users
+
+    def is_dirty(self, dataset: str) -> bool:
+        return dataset in self.dirty
+
+    def dataset_version(self, dataset: str) -> int:
+        return self.versions.get(dataset, 0)
+
+    def is_saved_to(self, dataset: str, path: str) -> bool:
+        return self.source is not None and self.source.saved_version(dataset, path) == self.dataset_version(dataset)
+
+    def mark_clean(self, dataset: str, version: Optional[int] = None, path: Optional[str] = None):
+        """ثبت ذخیره شدن مجموعه داده تا نسخه همین snapshot؛ تغییرات بعدی ذخیره‌نشده می‌مانند"""
+        if self.source is not None:
+            self.source.mark_clean(dataset, self.dataset_version(dataset) if version is None else version, path)
+
+def _writes(method):
+    """اجرای اتمیک متد تغییردهنده زیر قفل نوشتن؛ رویدادها پس از آزاد شدن قفل ارسال می‌شوند"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.batch():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def _reads(method):
+    """اجرای متد خواننده زیر قفل خواندن"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock.read():
+            return method(self, *args, **kwargs)
+    return wrapper
+
 class DataManager:
     """مدیریت داده‌ها در حافظه"""
-    def __init__(self):
+    def __init__(self, columnar: bool = False, stock_policy: Optional[StockPolicy] = None, debug: bool = False,
+                 thread_safe: bool = False, undo_depth: int = 100, hourly_product_rollups: bool = False):
         self.products: List[Product] = []
-        self.transactions: List[Transaction] = []
+        if columnar:
+            # دفتر ستونی برای حجم بالای تراکنش‌ها (نیازمند numpy)
+            from ledger import ColumnarLedger
+            self.transactions = ColumnarLedger()
+        else:
+            self.transactions: List[Transaction] = []
         self.users: List[User] = []
+        # ایندکس کد کالا برای دسترسی O(1)
+        self._products_by_code: Dict[str, Product] = {}
+        # ایندکس شماره ردیف تراکنش‌های هر کالا در دفتر
+        self._transactions_by_product: Dict[str, array] = {}
+        # تعداد ردیف‌های دفتر که در موجودی ذخیره‌شده (snapshot) لحاظ شده‌اند؛
+        # None یعنی snapshot قدیمی بدون نشانگر که کل دفتر ذخیره‌شده را پوشش می‌دهد
+        self.stock_watermark: Optional[int] = None
+        # مشترکین رویدادهای تغییر و صف رویدادهای دسته جاری
+        self._subscribers: List[Callable[[List[ChangeEvent]], None]] = []
+        self._batch_depth = 0
+        self._pending_events: List[ChangeEvent] = []
+        # آمار تجمیعی که با هر تغییر در O(1) به‌روز می‌شود
+        self._total_stock = 0
+        self._total_capacity = 0
+        self._category_counts: Dict[str, int] = {}
+        # کالاها مرتب بر اساس نسبت پرشدگی؛ آستانه‌ها از stock_policy خوانده می‌شوند
+        self.stock_policy = stock_policy or StockPolicy()
+        self._fill_index = FillRatioIndex()
+        # ایندکس جستجوی کالاها و ترتیب ثبت آن‌ها در فهرست
+        self._search_index = TrigramIndex()
+        self._product_order: Dict[str, int] = {}
+        # ترتیب ثبت هر ردیف self.products (صعودی)؛ جای کالا در فهرست با جستجوی دودویی پیدا می‌شود
+        self._orders: List[int] = []
+        self._next_order = 0
+        # تجمیع زمانی تراکنش‌ها (ساعتی، روزانه، ماهانه)
+        self._rollups = TransactionRollups(GRANULARITIES if hourly_product_rollups else ('day', 'month'))
+        # ایندکس مرتب تاریخ برای پرس‌وجوی بازه‌ای
+        self._date_index = DateIndex()
+        # در حالت debug آمار پس از هر تغییر با پیمایش کامل مقایسه می‌شود
+        self.debug = debug
+        # در حالت thread_safe خواندن‌ها هم‌زمان و نوشتن‌ها انحصاری هستند
+        self._lock = ReadWriteLock() if thread_safe else NullLock()
+        # دفتر عملیات برای بازگردانی/انجام مجدد با عمق محدود
+        self._undo_stack = deque(maxlen=undo_depth)
+        self._redo_stack = deque(maxlen=undo_depth)
+        self._replaying = False
+        # نسخه هر مجموعه داده با هر تغییر افزایش می‌یابد؛ نسخه ذخیره‌شده پس از هر ذخیره ثبت می‌شود
+        self._versions: Dict[str, int] = {dataset: 0 for dataset in DATASETS}
+        self._saved_versions: Dict[str, int] = {dataset: 0 for dataset in DATASETS}
+        # نسخه ذخیره‌شده در هر فایل؛ ذخیره در یک قالب فایل قالب دیگر را به‌روز نمی‌کند
+        self._saved_paths: Dict[str, Dict[str, int]] = {dataset: {} for dataset in DATASETS}
+        # تغییرات ذخیره‌نشده کالاها و کاربران: کد کالا یا نام کاربری -> نسخه تغییر
+        self._changes: Dict[str, Dict[object, int]] = {'products': {}, 'users': {}}
+        # برای دفتر فقط کوچک‌ترین ردیف تغییرکرده و نسخه آخرین تغییر نگه داشته می‌شود
+        self._ledger_dirty_from: Optional[int] = None
+        self._ledger_dirty_version = 0
+
+    def subscribe(self, callback: Callable[[List[ChangeEvent]], None]):
+        """ثبت تابعی که فهرست رویدادهای تغییر را دریافت می‌کند"""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[List[ChangeEvent]], None]):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    @contextmanager
+    def batch(self):
+        """اجرای اتمیک چند تغییر زیر قفل نوشتن و ارسال یک‌جای رویدادها در پایان"""
+        events = []
+        try:
+            with self._lock.write():
+                self._batch_depth += 1
+                try:
+                    yield self
+                finally:
+                    self._batch_depth -= 1
+                    if self._batch_depth == 0:
+                        events, self._pending_events = self._pending_events, []
+        finally:
+            if events:
+                self._notify(coalesce_events(events))
+
+    @_reads
+    def snapshot(self) -> DataSnapshot:
+        """رونوشت سازگار از کالاها، دفتر و کاربران که با تغییرات بعدی عوض نمی‌شود"""
+        if hasattr(self.transactions, 'copy'):
+            transactions = self.transactions.copy()
+        else:
+            transactions = tuple(self.transactions)
+        return DataSnapshot(
+            products=tuple(replace(p) for p in self.products),
+            transactions=transactions,
+            users=tuple(replace(u) for u in self.users),
+            versions=dict(self._versions),
+            dirty=frozenset(self.dirty_datasets()),
+            source=self
+        )
+
+    def _track_change(self, event: ChangeEvent):
+        dataset = _DATASET_BY_KIND[event.kind]
+        self._versions[dataset] += 1
+        version = self._versions[dataset]
+        if dataset == 'transactions':
+            # ردیف‌های بعد از کوچک‌ترین ردیف تغییرکرده باید دوباره نوشته شوند
+            if self._ledger_dirty_from is None or event.rows.start < self._ledger_dirty_from:
+                self._ledger_dirty_from = event.rows.start
+            self._ledger_dirty_version = version
+            return
+        changes = self._changes[dataset]
+        changes[event.key] = version
+        if event.old_key is not None:
+            changes[event.old_key] = version
+
+    def is_dirty(self, dataset: str) -> bool:
+        """آیا مجموعه داده ('products'، 'transactions' یا 'users') پس از آخرین ذخیره تغییر کرده است"""
+        return self._versions[dataset] != self._saved_versions[dataset]
+
+    def dirty_datasets(self) -> Set[str]:
+        return {dataset for dataset in DATASETS if self.is_dirty(dataset)}
+
+    def dataset_version(self, dataset: str) -> int:
+        return self._versions[dataset]
+
+    def saved_version(self, dataset: str, path: str) -> Optional[int]:
+        """نسخه‌ای از مجموعه داده که آخرین بار از فایل path خوانده یا در آن نوشته شده است"""
+        return self._saved_paths[dataset].get(os.path.abspath(path))
+
+    def is_saved_to(self, dataset: str, path: str) -> bool:
+        """آیا فایل path نسخه فعلی مجموعه داده را دارد"""
+        return self.saved_version(dataset, path) == self._versions[dataset]
+
+    @_reads
+    def get_changes(self, dataset: str):
+        """تغییرات ذخیره‌نشده: کدهای کالا یا نام‌های کاربری تغییرکرده، یا بازه ردیف‌های تغییرکرده دفتر"""
+        if dataset == 'transactions':
+            start = len(self.transactions) if self._ledger_dirty_from is None else self._ledger_dirty_from
+            return range(min(start, len(self.transactions)), len(self.transactions))
+        return set(self._changes[dataset])
+
+    @_writes
+    def mark_clean(self, dataset: str, version: Optional[int] = None, path: Optional[str] = None):
+        """ثبت ذخیره مجموعه داده تا نسخه version (پیش‌فرض: نسخه فعلی)، در صورت وجود در فایل path"""
+        if version is None:
+            version = self._versions[dataset]
+        self._saved_versions[dataset] = max(self._saved_versions[dataset], version)
+        if path is not None:
+            path = os.path.abspath(path)
+            saved_paths = self._saved_paths[dataset]
+            saved_paths[path] = max(saved_paths.get(path, version), version)
+        if dataset == 'transactions':
+            # تغییرات بعد از version ردیف شروع جداگانه ندارند؛ تا ذخیره کامل بعدی کوچک‌ترین ردیف حفظ می‌شود
+            if self._ledger_dirty_version <= version:
+                self._ledger_dirty_from = None
+            return
+        changes = self._changes[dataset]
+        for key in [key for key, changed in changes.items() if changed <= version]:
+            del changes[key]
+
+    def _emit(self, event: ChangeEvent):
+        self._track_change(event)
+        if self.debug:
+            mismatches = self.verify_aggregates()
+            assert not mismatches, f'آمار تجمیعی ناسازگار است: {mismatches}'
+        if not self._subscribers:
+            return
+        if self._batch_depth:
+            self._pending_events.append(event)
+        else:
+            self._notify([event])
 
-    def add_product(self, product: Product):
-        self.products.append(product)
+    def _notify(self, events: List[ChangeEvent]):
+        # تغییر پیش از اطلاع‌رسانی اعمال شده است؛ خطای یک مشترک نباید بقیه یا فراخواننده را متوقف کند
+        for callback in list(self._subscribers):
+            try:
+                callback(events)
+            except Exception as e:
+                print(f"خطا در پردازش رویدادهای تغییر توسط {getattr(callback, '__qualname__', callback)}: {e!r}")
 
-    def update_product(self, code: str, updated_product: Product):
-        for i, p in enumerate(self.products):
-            if p.code == code:
-                self.products[i] = updated_product
-                break
+    @_writes
+    def add_product(self, product: Product) -> bool:
+        """افزودن کالا؛ در صورت تکراری بودن کد False برمی‌گرداند"""
+        if product.code in self._products_by_code:
+            return False
+        self._insert_product(product, self._next_order)
+        self._next_order += 1
+        self._record(('add_product', product))
+        return True
 
-    def delete_product(self, code: str):
-        self.products = [p for p in self.products if p.code != code]
+    @_writes
+    def add_products(self, products: Iterable[Product]) -> List[Tuple[int, str]]:
+        """افزودن گروهی کالاها؛ کدهای تکراری رد شده و (شماره ردیف، دلیل) آن‌ها برگردانده می‌شود"""
+        rejected: List[Tuple[int, str]] = []
+        for i, product in enumerate(products):
+            if product.code in self._products_by_code:
+                rejected.append((i, 'کد کالا تکراری است'))
+                continue
+            self._insert_product(product, self._next_order)
+            self._next_order += 1
+        self._clear_journal()
+        return rejected
 
+    def _insert_product(self, product: Product, order: int):
+        position = bisect_left(self._orders, order)
+        self.products.insert(position, product)
+        self._orders.insert(position, order)
+        self._products_by_code[product.code] = product
+        self._index_product(product)
+        self._product_order[product.code] = order
+        self._account_product(product, 1)
+        self._emit(ChangeEvent(ChangeKind.PRODUCT_ADDED, product.code))
+
+    def _product_position(self, code: str) -> int:
+        return bisect_left(self._orders, self._product_order[code])
+
+    @_reads
+    def get_product_position(self, code: str) -> Optional[int]:
+        """شماره ردیف کالا در فهرست کالاها"""
+        if code not in self._product_order:
+            return None
+        return self._product_position(code)
+
+    @_writes
+    def update_product(self, code: str, updated_product: Product) -> bool:
+        """ویرایش کالا؛ تغییر کد به کد تکراری رد می‌شود"""
+        old_product = self._products_by_code.get(code)
+        if old_product is None:
+            return False
+        if updated_product.code != code and updated_product.code in self._products_by_code:
+            return False
+        self.products[self._product_position(code)] = updated_product
+        del self._products_by_code[code]
+        self._products_by_code[updated_product.code] = updated_product
+        self._search_index.remove(code)
+        self._index_product(updated_product)
+        self._product_order[updated_product.code] = self._product_order.pop(code)
+        self._account_product(old_product, -1)
+        self._account_product(updated_product, 1)
+        self._emit(ChangeEvent(ChangeKind.PRODUCT_UPDATED, updated_product.code, old_key=code))
+        self._record(('update_product', old_product, updated_product))
+        return True
+
+    @_writes
+    def delete_product(self, code: str) -> bool:
+        product = self._products_by_code.pop(code, None)
+        if product is None:
+            return False
+        position = self._product_position(code)
+        del self.products[position]
+        del self._orders[position]
+        rows = self._transactions_by_product.pop(code, None)
+        # تجمیع‌های کالا همراه با ایندکس ردیف‌هایش کنار گذاشته می‌شوند تا کالای هم‌کد بعدی آن‌ها را به ارث نبرد
+        rollups = self._rollups.pop_product(code)
+        self._search_index.remove(code)
+        order = self._product_order.pop(code)
+        self._account_product(product, -1)
+        self._emit(ChangeEvent(ChangeKind.PRODUCT_REMOVED, code))
+        self._record(('delete_product', product, order, rows, rollups))
+        return True
+
+    @_writes
     def add_transaction(self, transaction: Transaction):
-        self.transactions.append(transaction)
+        self._append_to_ledger([transaction])
         # به‌روزرسانی موجودی کالا
+        if transaction.transaction_type == 'ورود':
+            self._apply_stock_deltas({transaction.product_code: transaction.quantity})
+        elif transaction.transaction_type == 'خروج':
+            self._apply_stock_deltas({transaction.product_code: -transaction.quantity})
+        self._record(('add_transaction', transaction))
+
+    def _pop_transaction(self, transaction: Transaction):
+        """حذف آخرین ردیف دفتر و برگرداندن اثر آن (فقط برای بازگردانی)"""
+        row = len(self.transactions) - 1
+        self.transactions.pop()
+        rows = self._transactions_by_product.get(transaction.product_code)
+        if rows:
+            rows.pop()
+        self._rollups.add(transaction, sign=-1)
+        self._date_index.remove(transaction.date, row)
+        if transaction.transaction_type == 'ورود':
+            self._apply_stock_deltas({transaction.product_code: -transaction.quantity})
+        elif transaction.transaction_type == 'خروج':
+            self._apply_stock_deltas({transaction.product_code: transaction.quantity})
+        self._emit(ChangeEvent(ChangeKind.TRANSACTION_REMOVED, rows=range(row, row + 1)))
+
+    def _record(self, operation: tuple):
+        """ثبت عملیات در دفتر بازگردانی؛ عملیات جدید مسیر انجام مجدد را پاک می‌کند"""
+        if self._replaying:
+            return
+        self._undo_stack.append(operation)
+        self._redo_stack.clear()
+
+    def _clear_journal(self):
+        """تغییرات گروهی دفتر قابل بازگردانی نیستند و دفتر عملیات را پاک می‌کنند"""
+        self._undo_stack.clear()
+        self._redo_stack.clear()
+
+    def can_undo(self) -> bool:
+        return bool(self._undo_stack)
+
+    def can_redo(self) -> bool:
+        return bool(self._redo_stack)
+
+    @_writes
+    def undo(self) -> bool:
+        """برگرداندن آخرین عملیات از طریق همان مسیرهای افزایشی"""
+        if not self._undo_stack:
+            return False
+        operation = self._undo_stack.pop()
+        kind = operation[0]
+        self._replaying = True
+        try:
+            if kind == 'add_product':
+                self.delete_product(operation[1].code)
+            elif kind == 'update_product':
+                old_product, updated_product = operation[1], operation[2]
+                current = self._products_by_code[updated_product.code]
+                self.update_product(updated_product.code, replace(old_product, current_stock=current.current_stock))
+            elif kind == 'delete_product':
+                product, order, rows, rollups = operation[1:]
+                self._insert_product(product, order)
+                if rows is not None:
+                    self._transactions_by_product[product.code] = rows
+                self._rollups.restore_product(product.code, rollups)
+            elif kind == 'add_transaction':
+                self._pop_transaction(operation[1])
+        finally:
+            self._replaying = False
+        self._redo_stack.append(operation)
+        return True
+
+    @_writes
+    def redo(self) -> bool:
+        """انجام دوباره آخرین عملیات بازگردانده‌شده"""
+        if not self._redo_stack:
+            return False
+        operation = self._redo_stack.pop()
+        kind = operation[0]
+        self._replaying = True
+        try:
+            if kind == 'add_product':
+                self.add_product(operation[1])
+            elif kind == 'update_product':
+                old_product, updated_product = operation[1], operation[2]
+                current = self._products_by_code[old_product.code]
+                updated_product.current_stock = current.current_stock
+                self.update_product(old_product.code, updated_product)
+            elif kind == 'delete_product':
+                self.delete_product(operation[1].code)
+            elif kind == 'add_transaction':
+                self.add_transaction(operation[1])
+        finally:
+            self._replaying = False
+        self._undo_stack.append(operation)
+        return True
+
+    @_writes
+    def add_transactions(self, batch: Iterable[Transaction]) -> List[Tuple[int, str]]:
+        """ثبت گروهی تراکنش‌ها؛ ردیف‌های نامعتبر رد شده و (شماره ردیف، دلیل) آن‌ها برگردانده می‌شود"""
+        accepted: List[Transaction] = []
+        rejected: List[Tuple[int, str]] = []
+        for i, t in enumerate(batch):
+            if t.product_code not in self._products_by_code:
+                rejected.append((i, 'کالا یافت نشد'))
+            elif t.transaction_type not in ('ورود', 'خروج'):
+                rejected.append((i, 'نوع تراکنش نامعتبر است'))
+            elif t.quantity <= 0:
+                rejected.append((i, 'مقدار باید مثبت باشد'))
+            else:
+                accepted.append(t)
+
+        self._append_to_ledger(accepted)
+        self._apply_stock_deltas(self._net_quantities(accepted))
+        self._clear_journal()
+        return rejected
+
+    @_writes
+    def load_transactions(self, transactions: Iterable[Transaction]) -> int:
+        """بارگذاری دفتر ذخیره‌شده؛ فقط ردیف‌های بعد از stock_watermark روی موجودی اعمال می‌شوند"""
+        transactions = list(transactions)
+        start = len(self.transactions)
+        self._append_to_ledger(transactions)
+        self._clear_journal()
+        if self.stock_watermark is None:
+            return 0
+        replay = transactions[max(self.stock_watermark - start, 0):]
+        self._apply_stock_deltas(self._net_quantities(replay))
+        return len(replay)
+
+    @_writes
+    def truncate_transactions(self, length: int) -> int:
+        """حذف ردیف‌های انتهایی دفتر تا طول length همراه با برگرداندن اثرشان بر موجودی"""
+        removed = 0
+        while len(self.transactions) > length:
+            self._pop_transaction(self.transactions[-1])
+            removed += 1
+        if removed:
+            self._clear_journal()
+            if self.stock_watermark is not None:
+                self.stock_watermark = min(self.stock_watermark, length)
+        return removed
+
+    @_writes
+    def recompute_stock_from_ledger(self, apply: bool = True) -> Dict[str, Tuple[int, int]]:
+        """محاسبه مجدد موجودی از کل دفتر (برای حسابرسی)؛ مغایرت‌ها به صورت کد: (موجودی فعلی، موجودی دفتر)"""
+        ledger_stock = self.get_net_quantity_by_product()
+        mismatches = {}
+        for p in self.products:
+            expected = ledger_stock.get(p.code, 0)
+            if p.current_stock != expected:
+                mismatches[p.code] = (p.current_stock, expected)
+        if apply:
+            self._clear_journal()
+            self._apply_stock_deltas({code: expected - current for code, (current, expected) in mismatches.items()})
+        return mismatches
+
+    @staticmethod
+    def _net_quantities(transactions: Iterable[Transaction]) -> Dict[str, int]:
+        """جمع خالص ورود منهای خروج به تفکیک کد کالا"""
+        net_by_code: Dict[str, int] = {}
+        for t in transactions:
+            if t.transaction_type == 'ورود':
+                net_by_code[t.product_code] = net_by_code.get(t.product_code, 0) + t.quantity
+            elif t.transaction_type == 'خروج':
+                net_by_code[t.product_code] = net_by_code.get(t.product_code, 0) - t.quantity
+        return net_by_code
+
+    def _apply_stock_deltas(self, net_by_code: Dict[str, int]):
+        """اعمال یک‌باره تغییر خالص موجودی هر کالا"""
+        for code, delta in net_by_code.items():
+            p = self._products_by_code.get(code)
+            if p is not None:
+                p.current_stock += delta
+                self._total_stock += delta
+                self._fill_index.update(code, StockPolicy.fill_ratio(p), self._product_order[code])
+                self._emit(ChangeEvent(ChangeKind.STOCK_CHANGED, code))
+
+    def _append_to_ledger(self, transactions: List[Transaction]):
+        """افزودن یک‌جای ردیف‌ها به دفتر و ایندکس کالا"""
+        start = len(self.transactions)
+        for row, t in enumerate(transactions, start):
+            self._transactions_by_product.setdefault(t.product_code, array('q')).append(row)
+        self.transactions.extend(transactions)
+        self._rollups.add_many(transactions)
+        if len(transactions) == 1:
+            self._date_index.add(transactions[0].date, start)
+        else:
+            self._date_index.add_many((t.date for t in transactions), start)
+        if transactions:
+            self._emit(ChangeEvent(ChangeKind.TRANSACTIONS_APPENDED, rows=range(start, start + len(transactions))))
+
+    def _index_product(self, product: Product):
+        self._search_index.add(product.code, f"{product.code} {product.name} {product.category}")
+
+    @_reads
+    def search_products(self, query: str) -> List[Product]:
+        """کالاهایی که کد، نام یا دسته‌بندی آن‌ها شامل query است، به ترتیب فهرست"""
+        if not query:
+            return list(self.products)
+        codes = sorted(self._search_index.search(query), key=self._product_order.__getitem__)
+        return [self._products_by_code[code] for code in codes]
+
+    def _account_product(self, product: Product, sign: int):
+        """افزودن (sign=1) یا کسر (sign=-1) سهم یک کالا از آمار تجمیعی"""
+        self._total_stock += sign * product.current_stock
+        self._total_capacity += sign * product.capacity
+        if sign > 0:
+            self._fill_index.update(product.code, StockPolicy.fill_ratio(product), self._product_order[product.code])
+        else:
+            self._fill_index.remove(product.code)
+        count = self._category_counts.get(product.category, 0) + sign
+        if count:
+            self._category_counts[product.category] = count
+        else:
+            self._category_counts.pop(product.category, None)
+
+    @_reads
+    def get_critical_products(self, n: int = 10) -> List[Product]:
+        """n کالا با کمترین نسبت موجودی به ظرفیت"""
+        return [self._products_by_code[code] for code in self._fill_index.lowest(n)]
+
+    @_reads
+    def get_empty_products(self) -> List[Product]:
+        return [self._products_by_code[code] for code in self._fill_index.codes_between(0.0, 0.0)]
+
+    @_reads
+    def get_near_full_products(self) -> List[Product]:
+        """کالاهای با نسبت پرشدگی بیش از آستانه پر بودن سیاست"""
+        return [self._products_by_code[code] for code in self._fill_index.codes_above(self.stock_policy.full_ratio)]
+
+    @_reads
+    def get_stats(self) -> InventoryStats:
+        """آمار تجمیعی فعلی بدون پیمایش کالاها"""
+        return InventoryStats(
+            total_products=len(self.products),
+            total_transactions=len(self.transactions),
+            total_stock=self._total_stock,
+            total_capacity=self._total_capacity,
+            low_stock=self._fill_index.count_below(self.stock_policy.low_ratio),
+            categories=dict(self._category_counts)
+        )
+
+    @_reads
+    def verify_aggregates(self) -> Dict[str, Tuple[object, object]]:
+        """مقایسه آمار تجمیعی با پیمایش کامل؛ مغایرت‌ها به صورت نام: (مقدار جاری، مقدار صحیح)"""
+        categories: Dict[str, int] = {}
         for p in self.products:
-            if p.code == transaction.product_code:
-                if transaction.transaction_type == 'ورود':
-                    p.current_stock += transaction.quantity
-                elif transaction.transaction_type == 'خروج':
-                    p.current_stock -= transaction.quantity
-                break
+            categories[p.category] = categories.get(p.category, 0) + 1
+        expected = {
+            'total_stock': (self._total_stock, sum(p.current_stock for p in self.products)),
+            'total_capacity': (self._total_capacity, sum(p.capacity for p in self.products)),
+            'low_stock': (self._fill_index.count_below(self.stock_policy.low_ratio),
+                          sum(1 for p in self.products if self.stock_policy.classify(p) in ('empty', 'low'))),
+            'categories': (self._category_counts, categories),
+        }
+        return {name: values for name, values in expected.items() if values[0] != values[1]}
 
+    @_writes
     def add_user(self, user: User):
         self.users.append(user)
+        self._emit(ChangeEvent(ChangeKind.USER_ADDED, user.username))
 
+    @_writes
+    def add_users(self, users: Iterable[User]):
+        for user in users:
+            self.add_user(user)
+
+    @_reads
     def get_users(self):
         return self.users
 
     # سایر متدهای مفید
+    @_reads
     def get_products(self):
         return self.products
 
+    @_reads
     def get_transactions(self):
         return self.transactions
 
+    @_reads
     def get_product_by_code(self, code: str):
-        for p in self.products:
-            if p.code == code:
-                return p
-        return None
+        return self._products_by_code.get(code)
 
+    @_reads
     def get_transactions_by_product(self, product_code: str):
-        return [t for t in self.transactions if t.product_code == product_code]
\ No newline at end of file
+        rows = self._transactions_by_product.get(product_code, ())
+        return [self.transactions[i] for i in rows]
+
+    @_reads
+    def get_activity(self, granularity: str = 'day', start: Optional[datetime] = None,
+                     end: Optional[datetime] = None, product_code: Optional[str] = None):
+        """فعالیت ورود و خروج در بازه‌های 'hour'، 'day' یا 'month' از تجمیع‌های آماده"""
+        if product_code is not None and not self._rollups.tracks_products(granularity):
+            return self._product_rollups(product_code).activity(granularity, start, end)
+        return self._rollups.activity(granularity, start, end, product_code)
+
+    @_reads
+    def get_movement_last_days(self, days: int, product_code: Optional[str] = None) -> Tuple[int, int]:
+        """جمع (ورود، خروج) در N روز اخیر"""
+        if product_code is not None and not self._rollups.tracks_products('day'):
+            return self._product_rollups(product_code).movement_last_days(days)
+        return self._rollups.movement_last_days(days, product_code)
+
+    def _product_rollups(self, product_code: str) -> TransactionRollups:
+        """تجمیع موقت از ردیف‌های یک کالا برای بازه‌هایی که برای هر کالا نگه داشته نمی‌شوند"""
+        rollups = TransactionRollups(product_granularities=())
+        rollups.add_many(self.transactions[i] for i in self._transactions_by_product.get(product_code, ()))
+        return rollups
+
+    @_reads
+    def get_transactions_between(self, start: datetime, end: datetime) -> List[Transaction]:
+        """تراکنش‌های بین دو تاریخ (شامل هر دو) به ترتیب تاریخ"""
+        return [self.transactions[i] for i in self._date_index.rows_between(start, end)]
+
+    def iter_transactions_since(self, since: datetime) -> Iterator[Transaction]:
+        """پیمایش تراکنش‌های از تاریخ since به بعد به ترتیب تاریخ"""
+        # undo و حذف ردیف‌ها شماره ردیف‌ها را جابه‌جا می‌کنند، پس تراکنش‌ها هم زیر قفل خوانده می‌شوند
+        with self._lock.read():
+            transactions = [self.transactions[i] for i in self._date_index.rows_since(since)]
+        yield from transactions
+
+    @_writes
+    def rebuild_rollups(self):
+        """ساخت دوباره تجمیع‌های زمانی از کل دفتر"""
+        self._rollups.rebuild(self.transactions)
+        # ردیف‌های کالاهای حذف‌شده در دفتر می‌مانند ولی سری جداگانه ندارند
+        for code in self._rollups.product_codes() - self._transactions_by_product.keys():
+            self._rollups.pop_product(code)
+
+    @_reads
+    def get_net_quantity_by_product(self) -> Dict[str, int]:
+        """جمع خالص ورود منهای خروج هر کالا در کل دفتر"""
+        if hasattr(self.transactions, 'net_quantity_by_product'):
+            return self.transactions.net_quantity_by_product()
+        return self._net_quantities(self.transactions)
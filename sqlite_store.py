@@ -0,0 +1,145 @@
+import sqlite3
+import threading
+from datetime import datetime
+from typing import List
+from models import ChangeEvent, ChangeKind, DataManager, Product, Transaction, User, intern_str
+
+# ذخیره‌سازی افزایشی داده‌ها در SQLite؛ هر تغییر DataManager یک درج یا به‌روزرسانی تک‌ردیفی است
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS products (
+    code TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    category TEXT,
+    capacity INTEGER NOT NULL,
+    current_stock INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    row INTEGER PRIMARY KEY,
+    product_code TEXT NOT NULL,
+    transaction_type TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    date TEXT,
+    user TEXT
+);
+CREATE INDEX IF NOT EXISTS transactions_product_code ON transactions(product_code);
+CREATE INDEX IF NOT EXISTS transactions_date ON transactions(date);
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT,
+    role TEXT
+);
+'''
+
+_UPSERT_PRODUCT = '''
+INSERT INTO products (code, name, category, capacity, current_stock) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(code) DO UPDATE SET name = excluded.name, category = excluded.category,
+    capacity = excluded.capacity, current_stock = excluded.current_stock
+'''
+_INSERT_TRANSACTION = 'INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?, ?, ?)'
+_UPSERT_USER = 'INSERT OR REPLACE INTO users VALUES (?, ?, ?)'
+
+def _product_row(product: Product) -> tuple:
+    return (product.code, product.name, product.category, int(product.capacity), int(product.current_stock))
+
+def _transaction_row(row: int, t: Transaction) -> tuple:
+    date = None if t.date is None or t.date != t.date else t.date.strftime('%Y-%m-%d %H:%M:%S.%f')
+    return (row, t.product_code, t.transaction_type, int(t.quantity), date, t.user)
+
+def _user_row(user: User) -> tuple:
+    return (user.username, user.password, user.role)
+
+
+class SQLiteStore:
+    """پایگاه داده SQLite (حالت WAL) که با رویدادهای DataManager هم‌گام نگه داشته می‌شود"""
+    def __init__(self, path: str = 'inventory.db'):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._data_manager = None
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            for table in ('products', 'transactions', 'users'):
+                if self._conn.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone():
+                    return False
+            return True
+
+    def load(self, data_manager: DataManager):
+        """بارگذاری همه داده‌ها؛ موجودی ذخیره‌شده به‌روز است و تراکنش‌ها دوباره اعمال نمی‌شوند"""
+        with self._lock:
+            products = [Product(code, name, intern_str(category), capacity, stock)
+                        for code, name, category, capacity, stock in self._conn.execute(
+                            'SELECT code, name, category, capacity, current_stock FROM products ORDER BY rowid')]
+            transactions = [Transaction(intern_str(code), intern_str(kind), quantity,
+                                        datetime.fromisoformat(date) if date else None, intern_str(user))
+                            for code, kind, quantity, date, user in self._conn.execute(
+                                'SELECT product_code, transaction_type, quantity, date, user FROM transactions ORDER BY row')]
+            users = [User(username, password, intern_str(role))
+                     for username, password, role in self._conn.execute(
+                         'SELECT username, password, role FROM users ORDER BY rowid')]
+        data_manager.add_products(products)
+        data_manager.stock_watermark = None
+        data_manager.load_transactions(transactions)
+        data_manager.add_users(users)
+
+    def write_all(self, data_manager: DataManager):
+        """بازنویسی کامل پایگاه داده از DataManager (برای ورود اولیه از Excel)"""
+        snapshot = data_manager.snapshot()
+        with self._lock, self._conn:
+            for table in ('products', 'transactions', 'users'):
+                self._conn.execute(f'DELETE FROM {table}')
+            self._conn.executemany(_UPSERT_PRODUCT, map(_product_row, snapshot.get_products()))
+            self._conn.executemany(_INSERT_TRANSACTION,
+                                   (_transaction_row(i, t) for i, t in enumerate(snapshot.get_transactions())))
+            self._conn.executemany(_UPSERT_USER, map(_user_row, snapshot.get_users()))
+
+    def attach(self, data_manager: DataManager):
+        """ثبت تغییرات بعدی DataManager در پایگاه داده"""
+        self._data_manager = data_manager
+        data_manager.subscribe(self.on_data_changed)
+
+    def detach(self):
+        if self._data_manager is not None:
+            self._data_manager.unsubscribe(self.on_data_changed)
+            self._data_manager = None
+
+    def on_data_changed(self, events: List[ChangeEvent]):
+        """نوشتن رویدادهای یک دسته در یک تراکنش SQLite"""
+        dm = self._data_manager
+        with self._lock, self._conn:
+            for event in events:
+                if event.kind in (ChangeKind.PRODUCT_ADDED, ChangeKind.PRODUCT_UPDATED):
+                    if event.old_key is not None and event.old_key != event.key:
+                        self._conn.execute('UPDATE products SET code = ? WHERE code = ?', (event.key, event.old_key))
+                    product = dm.get_product_by_code(event.key)
+                    if product is not None:
+                        self._conn.execute(_UPSERT_PRODUCT, _product_row(product))
+                elif event.kind is ChangeKind.STOCK_CHANGED:
+                    product = dm.get_product_by_code(event.key)
+                    if product is not None:
+                        self._conn.execute('UPDATE products SET current_stock = ? WHERE code = ?',
+                                           (int(product.current_stock), product.code))
+                elif event.kind is ChangeKind.PRODUCT_REMOVED:
+                    self._conn.execute('DELETE FROM products WHERE code = ?', (event.key,))
+                elif event.kind is ChangeKind.TRANSACTIONS_APPENDED:
+                    transactions = dm.get_transactions()
+                    # ردیف‌هایی که در همان دسته بازگردانی شده‌اند دیگر در دفتر نیستند
+                    rows = range(event.rows.start, min(event.rows.stop, len(transactions)))
+                    self._conn.executemany(_INSERT_TRANSACTION,
+                                           (_transaction_row(i, transactions[i]) for i in rows))
+                elif event.kind is ChangeKind.TRANSACTION_REMOVED:
+                    self._conn.execute('DELETE FROM transactions WHERE row >= ?', (event.rows.start,))
+                elif event.kind is ChangeKind.USER_ADDED:
+                    for user in dm.get_users()[::-1]:
+                        if user.username == event.key:
+                            self._conn.execute(_UPSERT_USER, _user_row(user))
+                            break
+
+    def close(self):
+        self.detach()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,123 @@
+import threading
+import time
+import unittest
+from locks import ReadWriteLock
+
+# آزمون‌های قفل خواننده/نویسنده: ورود دوباره، ارتقای غیرمجاز و اولویت نویسنده
+
+TIMEOUT = 5
+
+
+def start(target) -> threading.Thread:
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread
+
+
+class ReadWriteLockTest(unittest.TestCase):
+    def setUp(self):
+        self.lock = ReadWriteLock()
+
+    def test_write_is_reentrant(self):
+        acquired = threading.Event()
+
+        def reader():
+            with self.lock.read():
+                acquired.set()
+
+        with self.lock.write():
+            with self.lock.write():
+                thread = start(reader)
+            # پس از خروج از لایه درونی، قفل هنوز در اختیار نویسنده است
+            self.assertFalse(acquired.wait(0.1))
+        self.assertTrue(acquired.wait(TIMEOUT))
+        thread.join(TIMEOUT)
+
+    def test_read_inside_write(self):
+        with self.lock.write():
+            with self.lock.read():
+                with self.lock.read():
+                    pass
+        # پس از آزادسازی کامل، نخ دیگر می‌تواند بنویسد
+        written = threading.Event()
+
+        def writer():
+            with self.lock.write():
+                written.set()
+
+        thread = start(writer)
+        self.assertTrue(written.wait(TIMEOUT))
+        thread.join(TIMEOUT)
+
+    def test_upgrade_read_to_write_raises(self):
+        errors = []
+
+        def try_write():
+            try:
+                self.lock.acquire_write()
+            except RuntimeError as e:
+                errors.append(e)
+
+        def upgrade():
+            with self.lock.read():
+                try_write()
+                with self.lock.read():
+                    try_write()
+
+        # در صورت نبود خطا نخ برای همیشه منتظر می‌ماند؛ آزمون در نخ جدا اجرا می‌شود
+        thread = start(upgrade)
+        thread.join(TIMEOUT)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(errors), 2)
+        # خطای ارتقا نباید شمارش خواننده‌ها یا نویسنده‌های منتظر را خراب کند
+        with self.lock.write():
+            pass
+
+    def test_reentrant_read_while_writer_waits(self):
+        writer_waiting = threading.Event()
+        written = threading.Event()
+
+        def writer():
+            writer_waiting.set()
+            with self.lock.write():
+                written.set()
+
+        with self.lock.read():
+            thread = start(writer)
+            writer_waiting.wait(TIMEOUT)
+            time.sleep(0.05)
+            # خواندن تودرتوی همین نخ نباید پشت نویسنده منتظر گیر کند
+            with self.lock.read():
+                self.assertFalse(written.is_set())
+        self.assertTrue(written.wait(TIMEOUT))
+        thread.join(TIMEOUT)
+
+    def test_writer_priority(self):
+        order = []
+        writer_started = threading.Event()
+
+        def writer():
+            writer_started.set()
+            with self.lock.write():
+                order.append('writer')
+
+        def late_reader():
+            with self.lock.read():
+                order.append('reader')
+
+        with self.lock.read():
+            writer_thread = start(writer)
+            writer_started.wait(TIMEOUT)
+            while not self.lock._waiting_writers:
+                time.sleep(0.001)
+            # خواننده جدید تا پایان کار نویسنده منتظر می‌ماند
+            reader_thread = start(late_reader)
+            time.sleep(0.05)
+            self.assertEqual(order, [])
+        writer_thread.join(TIMEOUT)
+        reader_thread.join(TIMEOUT)
+        self.assertEqual(order, ['writer', 'reader'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,283 @@
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from models import ChangeEvent, ChangeKind, DataManager, DataSnapshot, Transaction, intern_str
+
+# دفتر فقط-افزودنی تراکنش‌ها روی دیسک (JSON lines) با فشرده‌سازی دوره‌ای در فایل‌های Excel
+
+def _encode(row: int, t: Transaction) -> dict:
+    date = None if t.date is None or t.date != t.date else t.date.strftime('%Y-%m-%d %H:%M:%S.%f')
+    return {'row': row, 'product_code': t.product_code, 'transaction_type': t.transaction_type,
+            'quantity': int(t.quantity), 'date': date, 'user': t.user}
+
+def _decode(record: dict) -> Transaction:
+    date = record['date']
+    return Transaction(
+        product_code=intern_str(record['product_code']),
+        transaction_type=intern_str(record['transaction_type']),
+        quantity=int(record['quantity']),
+        date=datetime.fromisoformat(date) if date else None,
+        user=intern_str(record['user'])
+    )
+
+
+def _row_of(record, key: str) -> int:
+    """شماره ردیف رکورد؛ برای رکورد با ساختار نامعتبر ValueError"""
+    row = record.get(key) if isinstance(record, dict) else None
+    if type(row) is not int or row < 0:
+        raise ValueError(f'شماره ردیف نامعتبر: {row!r}')
+    return row
+
+def _repair_tail(path: str):
+    """حذف خط ناقص پایانی پس از قطع ناگهانی تا رکورد بعدی به آن چسبیده نشود"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b'\n':
+            return
+        # جستجوی آخرین '\n' از انتهای فایل به صورت تکه‌ای
+        end = size
+        while end > 0:
+            start = max(0, end - 65536)
+            f.seek(start)
+            position = f.read(end - start).rfind(b'\n')
+            if position != -1:
+                end = start + position + 1
+                break
+            end = start
+        f.truncate(end)
+        f.flush()
+        os.fsync(f.fileno())
+
+def _read_records(path: str) -> List[dict]:
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # خط خراب نادیده گرفته می‌شود؛ رکوردهای بعدی همچنان بازپخش می‌شوند
+                print(f"رکورد نامعتبر در دفتر {path} نادیده گرفته شد.")
+                continue
+    return records
+
+
+class TransactionLog:
+    """ثبت هر تراکنش پذیرفته‌شده به صورت یک خط JSON با fsync؛ رکوردها شماره ردیف مطلق دارند و بازپخش آن‌ها تکرارپذیر است"""
+    def __init__(self, path: str, fold: Callable[[DataSnapshot], None],
+                 compact_every: int = 10000, background: bool = False):
+        self.path = path
+        self._fold = fold  # نوشتن snapshot در فایل‌های اصلی (مثلاً Excel)
+        self.compact_every = compact_every
+        self.background = background  # فقط برای DataManager با thread_safe=True
+        self._lock = threading.Lock()
+        self._compaction: Optional[threading.Thread] = None
+        self._data_manager = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        _repair_tail(path)
+        self._records = self._count_records()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _count_records(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, encoding='utf-8') as f:
+            return sum(1 for _ in f)
+
+    def replay(self, data_manager: DataManager) -> int:
+        """اعمال رکوردهای دفتر روی داده‌های بارگذاری‌شده از فایل‌های اصلی"""
+        # همه رکوردها پس از snapshot نوشته شده‌اند و باید روی موجودی اعمال شوند
+        if data_manager.stock_watermark is None:
+            data_manager.stock_watermark = len(data_manager.get_transactions())
+        records = _read_records(self.path)
+        pending: List[Transaction] = []
+        for record in records:
+            try:
+                if isinstance(record, dict) and 'truncate' in record:
+                    row, transaction = _row_of(record, 'truncate'), None
+                else:
+                    row, transaction = _row_of(record, 'row'), _decode(record)
+            except (KeyError, TypeError, ValueError):
+                print(f"رکورد نامعتبر در دفتر {self.path} نادیده گرفته شد.")
+                continue
+            length = len(data_manager.get_transactions()) + len(pending)
+            if row < length:
+                # رکورد تکراری (قبلاً در snapshot لحاظ شده) یا حذف ردیف‌ها؛ ادامه از همان ردیف
+                data_manager.load_transactions(pending)
+                pending = []
+                data_manager.truncate_transactions(row)
+            if transaction is None:
+                continue
+            if row > length:
+                print(f"دفتر تراکنش {self.path} ناپیوسته است؛ بازپخش در ردیف {row} متوقف شد.")
+                break
+            pending.append(transaction)
+        data_manager.load_transactions(pending)
+        return len(records)
+
+    def attach(self, data_manager: DataManager):
+        self._data_manager = data_manager
+        data_manager.subscribe(self.on_data_changed)
+
+    def detach(self):
+        # مرجع DataManager برای فشرده‌سازی در جریان نگه داشته می‌شود
+        if self._data_manager is not None:
+            self._data_manager.unsubscribe(self.on_data_changed)
+
+    def on_data_changed(self, events: List[ChangeEvent]):
+        records = []
+        for event in events:
+            if event.kind is ChangeKind.TRANSACTIONS_APPENDED:
+                transactions = self._data_manager.get_transactions()
+                # ردیف‌هایی که در همان دسته بازگردانی شده‌اند دیگر در دفتر نیستند
+                for row in range(event.rows.start, min(event.rows.stop, len(transactions))):
+                    records.append(_encode(row, transactions[row]))
+            elif event.kind is ChangeKind.TRANSACTION_REMOVED:
+                records.append({'truncate': event.rows.start})
+        if records:
+            self.append(records)
+
+    def append(self, records: List[dict]):
+        """افزودن رکوردها به انتهای فایل و fsync پیش از بازگشت"""
+        with self._lock:
+            self._file.write(''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._records += len(records)
+            due = self._records >= self.compact_every
+        if due:
+            if self.background:
+                self.compact_in_background()
+            else:
+                self.compact()
+
+    def compact(self):
+        """نوشتن snapshot در فایل‌های اصلی و حذف رکوردهای لحاظ‌شده از ابتدای دفتر"""
+        with self._lock:
+            covered = self._records
+        # رکوردهای شمارش‌شده همه در snapshot هستند؛ رکوردهای بعدی در دفتر می‌مانند
+        self._fold(self._data_manager.snapshot())
+        with self._lock:
+            with open(self.path, encoding='utf-8') as f:
+                kept = f.readlines()[covered:]
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.writelines(kept)
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(temp_path, self.path)
+            self._file = open(self.path, 'a', encoding='utf-8')
+            self._records = len(kept)
+
+    def compact_in_background(self) -> Optional[threading.Thread]:
+        """فشرده‌سازی در نخ پس‌زمینه؛ اگر فشرده‌سازی دیگری در جریان باشد کاری انجام نمی‌شود"""
+        with self._lock:
+            if self._compaction is not None and self._compaction.is_alive():
+                return None
+            self._compaction = threading.Thread(target=self.compact, daemon=True)
+            self._compaction.start()
+            return self._compaction
+
+    def close(self):
+        self.detach()
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+        with self._lock:
+            self._file.close()
+
+
+class TransferLog:
+    """دفتر انتقال‌های بین انبارها: رکورد هر انتقال پیش از نوشتن دو طرف آن در دفتر انبارها fsync می‌شود؛
+    پس از قطع ناگهانی، طرفی از انتقال ناتمام که به دفتر انبار خود نرسیده دوباره اعمال می‌شود"""
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        _repair_tail(path)
+        records = [r for r in _read_records(path) if isinstance(r, dict)]
+        finished = {r.get('id') for r in records if r.get('done')}
+        # انتقال‌های ناتمام جلسه قبل -> انبارهایی که طرفشان هنوز بررسی نشده است
+        self._unresolved: Dict[str, Tuple[dict, set]] = {
+            r['id']: (r, set(r['legs'])) for r in records
+            if isinstance(r.get('legs'), dict) and r.get('id') not in finished}
+        self._active = 0  # انتقال‌های در جریان همین جلسه
+        self._file = open(path, 'a', encoding='utf-8')
+        self._reset_if_idle()
+
+    def _write(self, record: dict):
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _reset_if_idle(self):
+        # وقتی هیچ انتقالی ناتمام نیست همه رکوردها زائدند
+        if not self._active and not self._unresolved and os.fstat(self._file.fileno()).st_size:
+            self._file.truncate(0)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def begin(self, source: str, target: str, out_row: int, withdrawal: Transaction,
+              in_row: int, entry: Transaction) -> str:
+        """ثبت انتقال پیش از اعمال آن؛ شناسه انتقال برای finish برگردانده می‌شود"""
+        transfer_id = uuid.uuid4().hex
+        with self._lock:
+            self._write({'id': transfer_id,
+                         'legs': {source: _encode(out_row, withdrawal), target: _encode(in_row, entry)}})
+            self._active += 1
+        return transfer_id
+
+    def finish(self, transfer_id: str):
+        """ثبت پایان انتقال (انجام‌شده یا بازگردانده‌شده) پس از ماندگار شدن هر دو طرف آن"""
+        with self._lock:
+            self._write({'id': transfer_id, 'done': True})
+            self._active -= 1
+            self._reset_if_idle()
+
+    def recover(self, name: str, data_manager: DataManager) -> int:
+        """اعمال طرف‌های جامانده انتقال‌های ناتمام برای انبار name؛ تعداد ردیف‌های افزوده‌شده برگردانده می‌شود"""
+        applied = 0
+        with self._lock:
+            for transfer_id, (record, remaining) in list(self._unresolved.items()):
+                if name not in remaining:
+                    continue
+                try:
+                    leg = record['legs'][name]
+                    row, transaction = _row_of(leg, 'row'), _decode(leg)
+                except (KeyError, TypeError, ValueError):
+                    print(f"رکورد نامعتبر انتقال {transfer_id} در دفتر {self.path} نادیده گرفته شد.")
+                    row = None
+                if row is not None:
+                    length = len(data_manager.get_transactions())
+                    if row == length:
+                        rejected = data_manager.add_transactions([transaction])
+                        if rejected:
+                            print(f"انتقال {transfer_id} در انبار {name} اعمال نشد: {rejected[0][1]}")
+                        else:
+                            applied += 1
+                    elif row > length:
+                        print(f"انتقال {transfer_id} در انبار {name} ناپیوسته است و اعمال نشد.")
+                remaining.discard(name)
+                if not remaining:
+                    self._write({'id': transfer_id, 'done': True})
+                    del self._unresolved[transfer_id]
+            self._reset_if_idle()
+        return applied
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -1,86 +1,236 @@
 import pandas as pd
+import hashlib
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from models import Product, Transaction, User, DataManager
+from typing import Callable, Iterator, List, Optional, Sequence
+from models import Product, Transaction, User, DataManager, intern_str
+from sqlite_store import SQLiteStore
 
 # توابع کمکی برای مدیریت فایل‌های Excel
 
+# ستون‌های فایل‌های کالا و تراکنش
+PRODUCT_COLUMNS = ['کد', 'نام', 'دسته‌بندی', 'ظرفیت', 'موجودی فعلی']
+TRANSACTION_COLUMNS = ['کد محصول', 'نوع تراکنش', 'مقدار', 'تاریخ', 'کاربر']
+
+# تعداد ردیف هر row group در Parquet؛ فیلتر تاریخ گروه‌های خارج از بازه را نمی‌خواند
+PARQUET_ROW_GROUP_SIZE = 65536
+
+# تعداد ردیف هر دسته در بارگذاری جریانی تراکنش‌ها
+TRANSACTION_BATCH_SIZE = 50000
+
+# پسوند فایل کش کنار هر فایل Excel: جدول خوانده‌شده به صورت Parquet و اثر انگشت فایل در metadata آن
+CACHE_SUFFIX = '.cache'
+
+# پایگاه داده اصلی؛ فایل‌های Excel فقط برای ورود و خروج داده استفاده می‌شوند
+DB_PATH = 'inventory.db'
+
+# برگه‌ای در products.xlsx که نشانگر تراکنش‌های لحاظ‌شده در موجودی را نگه می‌دارد
+SNAPSHOT_SHEET = 'snapshot'
+
+def _needs_save(data_manager: DataManager, dataset: str, file_path: str, force: bool) -> bool:
+    """ذخیره فقط وقتی لازم است که فایل وجود نداشته باشد یا نسخه فعلی داده در همین فایل خوانده یا نوشته نشده باشد"""
+    return force or not os.path.exists(file_path) or not data_manager.is_saved_to(dataset, file_path)
+
+def _products_frame(data_manager: DataManager) -> pd.DataFrame:
+    products = data_manager.get_products()
+    return pd.DataFrame({
+        'کد': [p.code for p in products],
+        'نام': [p.name for p in products],
+        'دسته‌بندی': [p.category for p in products],
+        'ظرفیت': [p.capacity for p in products],
+        'موجودی فعلی': [p.current_stock for p in products]
+    }, columns=PRODUCT_COLUMNS)
+
+def _products_from_frame(df: pd.DataFrame) -> List[Product]:
+    # تبدیل ستونی به جای iterrows
+    return [
+        Product(code=code, name=name, category=intern_str(category),
+                capacity=capacity, current_stock=stock)
+        for code, name, category, capacity, stock in zip(
+            df['کد'].tolist(),
+            df['نام'].tolist(),
+            df['دسته‌بندی'].tolist(),
+            df['ظرفیت'].astype('int64').tolist(),
+            df['موجودی فعلی'].astype('int64').tolist()
+        )
+    ]
+
+def _transactions_frame(data_manager: DataManager) -> pd.DataFrame:
+    transactions = data_manager.get_transactions()
+    return pd.DataFrame({
+        'کد محصول': [t.product_code for t in transactions],
+        'نوع تراکنش': [t.transaction_type for t in transactions],
+        'مقدار': [t.quantity for t in transactions],
+        'تاریخ': pd.to_datetime([t.date for t in transactions]),
+        'کاربر': [t.user for t in transactions]
+    }, columns=TRANSACTION_COLUMNS)
+
+def _transactions_from_frame(df: pd.DataFrame) -> List[Transaction]:
+    # تبدیل ستونی؛ تاریخ‌ها با یک فراخوانی pd.to_datetime و به صورت datetime پایتون
+    # (ساخت کلید ایندکس تاریخ و بازه‌های تجمیع روی datetime بسیار سریع‌تر از Timestamp است)
+    dates = list(pd.to_datetime(df['تاریخ']).dt.to_pydatetime())
+    return [
+        Transaction(product_code=intern_str(code), transaction_type=intern_str(kind),
+                    quantity=quantity, date=date, user=intern_str(user))
+        for code, kind, quantity, date, user in zip(
+            df['کد محصول'].tolist(),
+            df['نوع تراکنش'].tolist(),
+            df['مقدار'].astype('int64').tolist(),
+            dates,
+            df['کاربر'].tolist()
+        )
+    ]
+
+# خواندن هر فایل (قابل اجرا در فرایند جداگانه) از اعمال نتیجه روی DataManager جدا است
+
+def _read_products_file(file_path: str):
+    """خواندن فایل کالاها: (DataFrame، نشانگر موجودی یا None)"""
+    excel = pd.ExcelFile(file_path)
+    df = excel.parse(0)
+    watermark = None
+    if SNAPSHOT_SHEET in excel.sheet_names:
+        watermark = int(excel.parse(SNAPSHOT_SHEET)['watermark'].iloc[0])
+    return df, watermark
+
+def _apply_products(data_manager: DataManager, result, file_path: Optional[str] = None):
+    df, watermark = result
+    if watermark is not None:
+        data_manager.stock_watermark = watermark
+    if not df.empty:
+        data_manager.add_products(_products_from_frame(df))
+    data_manager.mark_clean('products', path=file_path)
+
+def _read_transactions_file(file_path: str) -> pd.DataFrame:
+    return pd.read_excel(file_path)
+
+def _apply_transactions(data_manager: DataManager, df: pd.DataFrame, file_path: Optional[str] = None):
+    if not df.empty:
+        # موجودی از snapshot کالاها بازیابی شده؛ فقط ردیف‌های بعد از نشانگر اعمال می‌شوند
+        data_manager.load_transactions(_transactions_from_frame(df))
+    data_manager.mark_clean('transactions', path=file_path)
+
+def _read_users_file(file_path: str) -> pd.DataFrame:
+    return pd.read_excel(file_path)
+
+def _apply_users(data_manager: DataManager, df: pd.DataFrame, file_path: Optional[str] = None):
+    if not df.empty:
+        data_manager.add_users([
+            User(username=username, password=password, role=intern_str(role))
+            for username, password, role in zip(
+                df['نام کاربری'].tolist(),
+                df['رمز عبور'].tolist(),
+                df['نقش'].tolist()
+            )
+        ])
+    data_manager.mark_clean('users', path=file_path)
+
 def load_products_from_excel(data_manager: DataManager, file_path: str = 'products.xlsx'):
     """بارگذاری کالاها از فایل Excel"""
     if os.path.exists(file_path):
-        df = pd.read_excel(file_path)
-        for _, row in df.iterrows():
-            product = Product(
-                code=row['کد'],
-                name=row['نام'],
-                category=row['دسته‌بندی'],
-                capacity=int(row['ظرفیت']),
-                current_stock=int(row['موجودی فعلی'])
-            )
-            data_manager.add_product(product)
+        _apply_products(data_manager, _read_products_file(file_path), file_path)
     else:
         print(f"فایل {file_path} یافت نشد. فایل جدید ایجاد خواهد شد.")
 
-def save_products_to_excel(data_manager: DataManager, file_path: str = 'products.xlsx'):
-    """ذخیره کالاها به فایل Excel"""
-    data = []
-    for product in data_manager.get_products():
-        data.append({
-            'کد': product.code,
-            'نام': product.name,
-            'دسته‌بندی': product.category,
-            'ظرفیت': product.capacity,
-            'موجودی فعلی': product.current_stock
-        })
-    df = pd.DataFrame(data)
-    df.to_excel(file_path, index=False)
+def save_products_to_excel(data_manager: DataManager, file_path: str = 'products.xlsx', force: bool = False) -> bool:
+    """ذخیره کالاها به فایل Excel؛ اگر کالاها پس از آخرین ذخیره تغییر نکرده باشند False برمی‌گرداند"""
+    if not _needs_save(data_manager, 'products', file_path, force):
+        return False
+    version = data_manager.dataset_version('products')
+    df = _products_frame(data_manager)
+    # موجودی ذخیره‌شده شامل همه تراکنش‌های فعلی دفتر است
+    snapshot = pd.DataFrame([{'watermark': len(data_manager.get_transactions())}])
+    with pd.ExcelWriter(file_path) as writer:
+        df.to_excel(writer, index=False)
+        snapshot.to_excel(writer, sheet_name=SNAPSHOT_SHEET, index=False)
+    data_manager.mark_clean('products', version, file_path)
+    return True
 
 def load_transactions_from_excel(data_manager: DataManager, file_path: str = 'transactions.xlsx'):
     """بارگذاری تراکنش‌ها از فایل Excel"""
     if os.path.exists(file_path):
-        df = pd.read_excel(file_path)
-        for _, row in df.iterrows():
-            transaction = Transaction(
-                product_code=row['کد محصول'],
-                transaction_type=row['نوع تراکنش'],
-                quantity=int(row['مقدار']),
-                date=pd.to_datetime(row['تاریخ']),
-                user=row['کاربر']
-            )
-            data_manager.add_transaction(transaction)
+        _apply_transactions(data_manager, _read_transactions_file(file_path), file_path)
     else:
         print(f"فایل {file_path} یافت نشد. فایل جدید ایجاد خواهد شد.")
 
-def save_transactions_to_excel(data_manager: DataManager, file_path: str = 'transactions.xlsx'):
-    """ذخیره تراکنش‌ها به فایل Excel"""
-    data = []
-    for transaction in data_manager.get_transactions():
-        data.append({
-            'کد محصول': transaction.product_code,
-            'نوع تراکنش': transaction.transaction_type,
-            'مقدار': transaction.quantity,
-            'تاریخ': transaction.date,
-            'کاربر': transaction.user
-        })
-    df = pd.DataFrame(data)
+def iter_transaction_batches_from_excel(file_path: str = 'transactions.xlsx',
+                                        batch_size: int = TRANSACTION_BATCH_SIZE) -> Iterator[List[Transaction]]:
+    """خواندن جریانی تراکنش‌ها با حالت read-only در openpyxl؛ حافظه به اندازه یک دسته محدود است"""
+    from openpyxl import load_workbook
+    workbook = load_workbook(file_path, read_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [header.index(name) for name in TRANSACTION_COLUMNS]
+        batch = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            batch.append([row[i] for i in columns])
+            if len(batch) >= batch_size:
+                yield _transactions_from_rows(batch)
+                batch = []
+        if batch:
+            yield _transactions_from_rows(batch)
+    finally:
+        workbook.close()
+
+def _transactions_from_rows(rows: List[list]) -> List[Transaction]:
+    return _transactions_from_frame(pd.DataFrame(rows, columns=TRANSACTION_COLUMNS))
+
+def stream_transactions_from_excel(data_manager: DataManager, file_path: str = 'transactions.xlsx',
+                                   batch_size: int = TRANSACTION_BATCH_SIZE,
+                                   progress: Optional[Callable[[int, Optional[int]], None]] = None) -> int:
+    """بارگذاری دسته‌ای تراکنش‌ها بدون ساخت DataFrame کل فایل؛ progress(ردیف‌های خوانده‌شده، کل ردیف‌ها یا None)"""
+    if not os.path.exists(file_path):
+        print(f"فایل {file_path} یافت نشد. فایل جدید ایجاد خواهد شد.")
+        return 0
+    total = _sheet_row_count(file_path)
+    loaded = 0
+    for batch in iter_transaction_batches_from_excel(file_path, batch_size):
+        # نشانگر موجودی بر اساس شماره ردیف مطلق است و بین دسته‌ها درست اعمال می‌شود
+        data_manager.load_transactions(batch)
+        loaded += len(batch)
+        if progress is not None:
+            progress(loaded, total)
+    data_manager.mark_clean('transactions', path=file_path)
+    return loaded
+
+def _sheet_row_count(file_path: str) -> Optional[int]:
+    """تعداد ردیف‌های داده از ابعاد ثبت‌شده در فایل (در صورت وجود)"""
+    from openpyxl import load_workbook
+    workbook = load_workbook(file_path, read_only=True)
+    try:
+        max_row = workbook.worksheets[0].max_row
+        return max_row - 1 if max_row else None
+    finally:
+        workbook.close()
+
+def save_transactions_to_excel(data_manager: DataManager, file_path: str = 'transactions.xlsx', force: bool = False) -> bool:
+    """ذخیره تراکنش‌ها به فایل Excel؛ اگر دفتر پس از آخرین ذخیره تغییر نکرده باشد False برمی‌گرداند"""
+    if not _needs_save(data_manager, 'transactions', file_path, force):
+        return False
+    version = data_manager.dataset_version('transactions')
+    df = _transactions_frame(data_manager)
     df.to_excel(file_path, index=False)
+    data_manager.mark_clean('transactions', version, file_path)
+    return True
 
 def load_users_from_excel(data_manager: DataManager, file_path: str = 'users.xlsx'):
     """بارگذاری کاربران از فایل Excel"""
     if os.path.exists(file_path):
-        df = pd.read_excel(file_path)
-        for _, row in df.iterrows():
-            user = User(
-                username=row['نام کاربری'],
-                password=row['رمز عبور'],
-                role=row['نقش']
-            )
-            data_manager.add_user(user)
+        _apply_users(data_manager, _read_users_file(file_path), file_path)
     else:
         print(f"فایل {file_path} یافت نشد. فایل جدید ایجاد خواهد شد.")
 
-def save_users_to_excel(data_manager: DataManager, file_path: str = 'users.xlsx'):
-    """ذخیره کاربران به فایل Excel"""
+def save_users_to_excel(data_manager: DataManager, file_path: str = 'users.xlsx', force: bool = False) -> bool:
+    """ذخیره کاربران به فایل Excel؛ اگر کاربران پس از آخرین ذخیره تغییر نکرده باشند False برمی‌گرداند"""
+    if not _needs_save(data_manager, 'users', file_path, force):
+        return False
+    version = data_manager.dataset_version('users')
     data = []
     for user in data_manager.get_users():
         data.append({
@@ -90,6 +240,184 @@ def save_users_to_excel(data_manager: DataManager, file_path: str = 'users.xlsx'
         })
     df = pd.DataFrame(data)
     df.to_excel(file_path, index=False)
+    data_manager.mark_clean('users', version, file_path)
+    return True
+
+def load_products_from_parquet(data_manager: DataManager, file_path: str = 'products.parquet'):
+    """بارگذاری کالاها از فایل Parquet"""
+    if os.path.exists(file_path):
+        import pyarrow.parquet as pq
+        table = pq.read_table(file_path)
+        metadata = table.schema.metadata or {}
+        if b'watermark' in metadata:
+            data_manager.stock_watermark = int(metadata[b'watermark'])
+        data_manager.add_products(_products_from_frame(table.to_pandas()))
+        data_manager.mark_clean('products', path=file_path)
+    else:
+        print(f"فایل {file_path} یافت نشد. فایل جدید ایجاد خواهد شد.")
+
+def save_products_to_parquet(data_manager: DataManager, file_path: str = 'products.parquet', force: bool = False) -> bool:
+    """ذخیره کالاها به فایل Parquet؛ نشانگر تراکنش‌های لحاظ‌شده در metadata فایل نگه داشته می‌شود"""
+    if not _needs_save(data_manager, 'products', file_path, force):
+        return False
+    version = data_manager.dataset_version('products')
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    table = pa.Table.from_pandas(_products_frame(data_manager), preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[b'watermark'] = str(len(data_manager.get_transactions())).encode()
+    pq.write_table(table.replace_schema_metadata(metadata), file_path)
+    data_manager.mark_clean('products', version, file_path)
+    return True
+
+def read_transactions_parquet(file_path: str = 'transactions.parquet', columns: Optional[Sequence[str]] = None,
+                              start: Optional[datetime] = None, end: Optional[datetime] = None,
+                              product_codes: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """خواندن بخشی از تراکنش‌ها برای گزارش؛ فقط ستون‌های لازم و row groupهای داخل بازه تاریخ خوانده می‌شوند.
+    فیلتر کد کالا روی ردیف‌های خوانده‌شده اعمال می‌شود: کدها در هر row group پراکنده‌اند و گروهی رد نمی‌شود"""
+    filters = []
+    if start is not None:
+        filters.append(('تاریخ', '>=', pd.Timestamp(start)))
+    if end is not None:
+        filters.append(('تاریخ', '<=', pd.Timestamp(end)))
+    if product_codes is not None:
+        filters.append(('کد محصول', 'in', list(product_codes)))
+    return pd.read_parquet(file_path, columns=list(columns) if columns is not None else None,
+                           filters=filters or None)
+
+def load_transactions_from_parquet(data_manager: DataManager, file_path: str = 'transactions.parquet'):
+    """بارگذاری کل دفتر تراکنش‌ها از فایل Parquet"""
+    if os.path.exists(file_path):
+        df = read_transactions_parquet(file_path)
+        data_manager.load_transactions(_transactions_from_frame(df))
+        data_manager.mark_clean('transactions', path=file_path)
+    else:
+        print(f"فایل {file_path} یافت نشد. فایل جدید ایجاد خواهد شد.")
+
+def save_transactions_to_parquet(data_manager: DataManager, file_path: str = 'transactions.parquet',
+                                 row_group_size: int = PARQUET_ROW_GROUP_SIZE, force: bool = False) -> bool:
+    """ذخیره تراکنش‌ها به فایل Parquet به ترتیب دفتر (که عملاً ترتیب تاریخ است)"""
+    if not _needs_save(data_manager, 'transactions', file_path, force):
+        return False
+    version = data_manager.dataset_version('transactions')
+    _transactions_frame(data_manager).to_parquet(file_path, index=False, row_group_size=row_group_size)
+    data_manager.mark_clean('transactions', version, file_path)
+    return True
+
+def open_store(data_manager: DataManager, db_path: str = DB_PATH,
+               progress: Optional[Callable[[int, Optional[int]], None]] = None) -> SQLiteStore:
+    """بارگذاری داده‌ها از SQLite و ثبت خودکار تغییرات بعدی؛ در اجرای اول داده‌ها از Excel وارد می‌شوند"""
+    store = SQLiteStore(db_path)
+    if store.is_empty():
+        if progress is None:
+            # فایل‌های Excel فقط یک بار وارد می‌شوند؛ کش آن‌ها هرگز دوباره خوانده نمی‌شد
+            load_excel_files(data_manager, use_cache=False)
+        else:
+            # بارگذاری جریانی با گزارش پیشرفت و حافظه محدود
+            load_products_from_excel(data_manager)
+            stream_transactions_from_excel(data_manager, progress=progress)
+            load_users_from_excel(data_manager)
+        store.write_all(data_manager)
+    else:
+        store.load(data_manager)
+    store.attach(data_manager)
+    return store
+
+def _fingerprint(file_path: str) -> tuple:
+    """اثر انگشت فایل: (اندازه، زمان تغییر به نانوثانیه، هش محتوا)"""
+    stat = os.stat(file_path)
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return stat.st_size, stat.st_mtime_ns, digest.hexdigest()
+
+def _load_cache(file_path: str, fingerprint: tuple):
+    """نتیجه خواندن ذخیره‌شده در کش در صورت تطابق اثر انگشت؛ در غیر این صورت None"""
+    cache_path = file_path + CACHE_SUFFIX
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        # Parquet فقط داده است و برخلاف pickle با خواندن فایل کدی اجرا نمی‌شود
+        import pyarrow.parquet as pq
+        table = pq.read_table(cache_path)
+        metadata = table.schema.metadata or {}
+        if json.loads(metadata[b'fingerprint']) != list(fingerprint):
+            return None
+        df = table.to_pandas()
+        if b'watermark' in metadata:
+            return df, json.loads(metadata[b'watermark'])
+        return df
+    except Exception:
+        # کش خراب، قدیمی یا نبود pyarrow فقط به خواندن دوباره فایل Excel منجر می‌شود
+        return None
+
+def _store_cache(file_path: str, fingerprint: tuple, result):
+    temp_path = file_path + CACHE_SUFFIX + '.tmp'
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        metadata = {b'fingerprint': json.dumps(list(fingerprint)).encode()}
+        if isinstance(result, tuple):
+            # نتیجه خواندن کالاها: (جدول، نشانگر موجودی)
+            result, watermark = result
+            metadata[b'watermark'] = json.dumps(watermark).encode()
+        table = pa.Table.from_pandas(result, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+        pq.write_table(table, temp_path)
+        os.replace(temp_path, file_path + CACHE_SUFFIX)
+    except Exception as e:
+        print(f"ذخیره کش {file_path} ممکن نشد: {e}")
+
+def load_excel_files(data_manager: DataManager, products_path: str = 'products.xlsx',
+                     transactions_path: str = 'transactions.xlsx', users_path: str = 'users.xlsx',
+                     parallel: bool = True, use_cache: bool = True):
+    """خواندن هم‌زمان سه فایل در فرایندهای جداگانه و اعمال نتایج در همین نخ به ترتیب وابستگی (کالاها پیش از تراکنش‌ها)؛
+    فایل‌هایی که اثر انگشتشان با کش کنارشان یکی است اصلاً تجزیه نمی‌شوند. کش برای بارگذاری انبارها است؛
+    برنامه اصلی داده‌ها را از SQLite می‌خواند و ورود اولیه آن (open_store) کش نمی‌سازد"""
+    steps = [(products_path, _read_products_file, _apply_products),
+             (transactions_path, _read_transactions_file, _apply_transactions),
+             (users_path, _read_users_file, _apply_users)]
+    results = {}
+    fingerprints = {}
+    missing = []
+    for path, read, _ in steps:
+        if not os.path.exists(path):
+            continue
+        if use_cache:
+            # اثر انگشت پیش از خواندن گرفته می‌شود تا تغییر هم‌زمان فایل کش نادرست نسازد
+            fingerprints[path] = _fingerprint(path)
+            cached = _load_cache(path, fingerprints[path])
+            if cached is not None:
+                results[path] = cached
+                continue
+        missing.append((path, read))
+    if parallel and len(missing) > 1:
+        with ProcessPoolExecutor(max_workers=len(missing)) as pool:
+            futures = {path: pool.submit(read, path) for path, read in missing}
+            parsed = {path: future.result() for path, future in futures.items()}
+    else:
+        parsed = {path: read(path) for path, read in missing}
+    for path, result in parsed.items():
+        if use_cache:
+            _store_cache(path, fingerprints[path], result)
+        results[path] = result
+    for path, _, apply in steps:
+        if path in results:
+            apply(data_manager, results[path], path)
+        else:
+            print(f"فایل {path} یافت نشد. فایل جدید ایجاد خواهد شد.")
+
+def load_warehouse(data_manager: DataManager, directory: str):
+    """بارگذاری فایل‌های یک انبار از پوشه آن (کالاها پیش از تراکنش‌ها)"""
+    load_excel_files(data_manager, os.path.join(directory, 'products.xlsx'),
+                     os.path.join(directory, 'transactions.xlsx'), os.path.join(directory, 'users.xlsx'))
+
+def save_warehouse(data_manager: DataManager, directory: str):
+    """ذخیره فایل‌های یک انبار در پوشه آن"""
+    save_products_to_excel(data_manager, os.path.join(directory, 'products.xlsx'))
+    save_transactions_to_excel(data_manager, os.path.join(directory, 'transactions.xlsx'))
+    save_users_to_excel(data_manager, os.path.join(directory, 'users.xlsx'))
 
 def validate_product(product: Product) -> bool:
     """اعتبارسنجی داده‌های کالا"""
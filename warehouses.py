@@ -0,0 +1,126 @@
+import os
+import threading
+from dataclasses import replace
+from datetime import datetime
+from typing import Dict, List, Optional
+from models import DataManager, InventoryStats, Transaction
+from transaction_log import TransactionLog, TransferLog
+from utils import load_warehouse, save_products_to_excel, save_warehouse
+
+# مدیریت چند انبار فیزیکی؛ هر انبار یک DataManager و پوشه فایل‌های جداگانه دارد
+
+class WarehouseManager:
+    """نگهداری DataManager هر انبار به صورت جداگانه و بارگذاری تنبل آن‌ها"""
+    def __init__(self, root_dir: str = 'warehouses', **data_manager_options):
+        self.root_dir = root_dir
+        self._options = data_manager_options
+        self._partitions: Dict[str, DataManager] = {}
+        self._logs: Dict[str, TransactionLog] = {}
+        self._lock = threading.Lock()
+        # انتقال‌های بین انبارها جدا از دفتر هر انبار ثبت می‌شوند تا هر دو طرف با هم بازیابی شوند
+        self._transfers = TransferLog(os.path.join(root_dir, 'transfers.log'))
+
+    def directory(self, name: str) -> str:
+        return os.path.join(self.root_dir, name)
+
+    def names(self) -> List[str]:
+        """نام همه انبارها (پوشه‌های موجود و انبارهای بارگذاری‌شده)"""
+        names = set(self._partitions)
+        if os.path.isdir(self.root_dir):
+            names.update(entry for entry in os.listdir(self.root_dir)
+                         if os.path.isdir(os.path.join(self.root_dir, entry)))
+        return sorted(names)
+
+    def get(self, name: str) -> DataManager:
+        """DataManager انبار؛ فایل‌های انبار فقط در اولین دسترسی بارگذاری می‌شوند"""
+        with self._lock:
+            data_manager = self._partitions.get(name)
+            if data_manager is None:
+                directory = self.directory(name)
+                data_manager = DataManager(**self._options)
+                load_warehouse(data_manager, directory)
+                # تراکنش‌های ثبت‌شده پس از آخرین ذخیره از دفتر فقط-افزودنی بازیابی می‌شوند
+                log = TransactionLog(os.path.join(directory, 'transactions.log'),
+                                     fold=lambda snapshot: save_warehouse(snapshot, directory),
+                                     background=self._options.get('thread_safe', False))
+                log.replay(data_manager)
+                log.attach(data_manager)
+                self._transfers.recover(name, data_manager)
+                self._partitions[name] = data_manager
+                self._logs[name] = log
+            return data_manager
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._partitions
+
+    def save(self, name: Optional[str] = None):
+        """ذخیره یک انبار یا همه انبارهای بارگذاری‌شده و فشرده‌سازی دفتر تراکنش آن‌ها"""
+        names = [name] if name is not None else list(self._partitions)
+        for partition_name in names:
+            self._logs[partition_name].compact()
+
+    def close(self):
+        for log in self._logs.values():
+            log.close()
+        self._transfers.close()
+
+    def transfer_stock(self, code: str, quantity: int, source: str, target: str,
+                       user: str, date: Optional[datetime] = None) -> Optional[str]:
+        """انتقال اتمیک موجودی بین دو انبار؛ در صورت خطا دلیل آن برگردانده می‌شود"""
+        if source == target:
+            return 'انبار مبدأ و مقصد یکسان است'
+        if quantity <= 0:
+            return 'مقدار باید مثبت باشد'
+        source_dm, target_dm = self.get(source), self.get(target)
+        date = date or datetime.now()
+        # قفل‌ها به ترتیب نام انبار گرفته می‌شوند تا بن‌بست رخ ندهد
+        first, second = (source_dm, target_dm) if source < target else (target_dm, source_dm)
+        created = False
+        transfer_id = None
+        with first.batch(), second.batch():
+            product = source_dm.get_product_by_code(code)
+            if product is None:
+                return 'کالا در انبار مبدأ یافت نشد'
+            if product.current_stock < quantity:
+                return 'موجودی انبار مبدأ کافی نیست'
+            source_length = len(source_dm.get_transactions())
+            target_length = len(target_dm.get_transactions())
+            withdrawal = Transaction(code, 'خروج', quantity, date, user)
+            entry = Transaction(code, 'ورود', quantity, date, user)
+            try:
+                if target_dm.get_product_by_code(code) is None:
+                    target_dm.add_product(replace(product, current_stock=0))
+                    created = True
+                    # دفتر فقط تراکنش‌ها را نگه می‌دارد؛ کالای جدید پیش از ثبت انتقال در فایل انبار مقصد نوشته می‌شود
+                    save_products_to_excel(target_dm, os.path.join(self.directory(target), 'products.xlsx'))
+                transfer_id = self._transfers.begin(source, target, source_length, withdrawal, target_length, entry)
+                # ثبت گروهی دفتر بازگردانی را پاک می‌کند تا undo یک انبار فقط نیمی از انتقال را برنگرداند
+                source_dm.add_transactions([withdrawal])
+                target_dm.add_transactions([entry])
+            except Exception:
+                # بازگردانی مستقیم؛ undo با undo_depth=0 یا تاریخچه دیگر قابل اتکا نیست
+                source_dm.truncate_transactions(source_length)
+                target_dm.truncate_transactions(target_length)
+                if created:
+                    target_dm.delete_product(code)
+                if transfer_id is not None:
+                    self._transfers.finish(transfer_id)
+                raise
+        # با پایان دسته‌ها هر دو طرف در دفتر انبارها fsync شده‌اند
+        self._transfers.finish(transfer_id)
+        return None
+
+    def get_total_stats(self, loaded_only: bool = True) -> InventoryStats:
+        """جمع آمار انبارها از آمار تجمیعی هر بخش؛ با loaded_only=False انبارهای بارگذاری‌نشده هم بارگذاری می‌شوند"""
+        names = list(self._partitions) if loaded_only else self.names()
+        total = InventoryStats()
+        for name in names:
+            stats = self.get(name).get_stats()
+            total.total_products += stats.total_products
+            total.total_transactions += stats.total_transactions
+            total.total_stock += stats.total_stock
+            total.total_capacity += stats.total_capacity
+            total.low_stock += stats.low_stock
+            for category, count in stats.categories.items():
+                total.categories[category] = total.categories.get(category, 0) + count
+        return total